@@ -27,9 +27,19 @@ def setup_package():
             # Need to install tesseract: https://github.com/UB-Mannheim/tesseract/wiki
             # (Window) Add installed directory to the environment variable
         ],
+        extras_require={
+            # persistent in-process OCR engine (faster timestamp export)
+            "tesserocr": ["tesserocr"],
+            # yaml manifests for --manifest
+            "yaml": ["pyyaml"],
+            # --ttl_format h5 / parquet
+            "h5": ["h5py"],
+            "parquet": ["pyarrow"],
+        },
         entry_points={
             "console_scripts": [
-                "extract_video = video_extractor.__main__:main"
+                "extract_video = video_extractor.__main__:main",
+                "extract_ttl_events = video_extractor.processing.ttl_events:main",
             ],
         },
     )
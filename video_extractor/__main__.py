@@ -1,10 +1,17 @@
-import sys
-from PyQt5.QtWidgets import QApplication
-from .gui import MainWindow
-from .processing import VideoReader
 import argparse
+import os
 import sys
 
+from .processing import VideoReader
+from .processing.parallel import export_video_chunked
+from .processing.checkpoint import export_video_checkpointed, CHECKPOINT_INTERVAL
+from .processing.profiler import StageProfiler
+from .processing.estimate import estimate_export, format_estimate, save_estimate, DRY_RUN_FRAMES
+from .processing.batch import load_manifest, run_batch, save_summary, print_summary
+from .processing.ocr import OCR_BACKENDS, OCR_CACHE_SIZE
+from .processing.ttl_io import TTL_FORMATS
+from .processing.writers import VIDEO_WRITERS, FFMPEG_CODEC, FFMPEG_CRF, FFMPEG_PRESET
+
 
 def build_args():
     parser = argparse.ArgumentParser()
@@ -22,6 +29,55 @@ def build_args():
                         help="skip video processing")
     parser.add_argument("--skip_ttl", action="store_true", default=False,
                         help="skip ttl extraction")
+    parser.add_argument("--pipeline", action="store_true", default=False,
+                        help="run decode, ROI transform and writing as parallel stages")
+    parser.add_argument("--threads", default=4, type=int,
+                        help="number of ROI worker threads for --pipeline")
+    parser.add_argument("--workers", default=1, type=int,
+                        help="number of worker processes, each exporting a chunk of frames")
+    parser.add_argument("--ocr_backend", default="auto", choices=OCR_BACKENDS,
+                        help="OCR engine for timestamps (auto: tesserocr if installed and working, otherwise pytesseract)")
+    parser.add_argument("--ocr_cache_size", default=OCR_CACHE_SIZE, type=int,
+                        help="number of cached OCR results per timestamp region (0: disable)")
+    parser.add_argument("--glyph_ocr", action="store_true", default=False,
+                        help="read timestamps with character templates learned from the first OCR results")
+    parser.add_argument("--predict_timestamp", action="store_true", default=False,
+                        help="OCR only anchor frames and interpolate the timestamps in between")
+    parser.add_argument("--anchor_interval", default=25, type=int,
+                        help="number of frames between OCR anchors for --predict_timestamp")
+    parser.add_argument("--ttl_format", default="csv", choices=TTL_FORMATS,
+                        help="TTL output format")
+    parser.add_argument("--ttl_events", action="store_true",
+                        help="also export TTL onsets/offsets to <fout>_ttl_events(%%d).csv")
+    parser.add_argument("--checkpoint", default=0, type=int,
+                        help="save a checkpoint every N frames (0: no checkpoint)")
+    parser.add_argument("--resume", action="store_true", default=False,
+                        help="continue an interrupted export from its last checkpoint")
+    parser.add_argument("--manifest", default=None, type=str,
+                        help="export all jobs (video, transform, fout, skip_*) listed in a csv/json/yaml file")
+    parser.add_argument("--jobs", default=1, type=int,
+                        help="number of manifest jobs exported at the same time")
+    parser.add_argument("--video_writer", default="opencv", choices=VIDEO_WRITERS,
+                        help="video encoder (opencv: XVID, ffmpeg: --video_codec/--crf/--preset, mjpg/ffv1: intra-only)")
+    parser.add_argument("--video_fps", default=None, type=float,
+                        help="frame rate of the exported videos (default: frame rate of the source video)")
+    parser.add_argument("--video_codec", default=FFMPEG_CODEC, type=str,
+                        help="ffmpeg codec for --video_writer=ffmpeg")
+    parser.add_argument("--crf", default=FFMPEG_CRF, type=int,
+                        help="quality of --video_writer=ffmpeg (libx264/libx265, lower is better)")
+    parser.add_argument("--preset", default=FFMPEG_PRESET, type=str,
+                        help="encoding speed preset of --video_writer=ffmpeg (libx264/libx265)")
+    parser.add_argument("--histeq_interval", default=None, type=int,
+                        help="ROIs with histeq reuse the equalization mapping for N frames instead of equalizing every frame")
+    parser.add_argument("--histeq_reference", default=None, type=int,
+                        help="ROIs with histeq are equalized with the mapping of this frame (stable brightness)")
+    parser.add_argument("--profile", action="store_true", default=False,
+                        help="time every export stage and save the report to <fout>_profile.json/txt")
+    parser.add_argument("--dry_run", action="store_true", default=False,
+                        help="export a sample of frames and report the estimated time and output sizes "
+                             "(saved to <fout>_dry_run.json) instead of exporting")
+    parser.add_argument("--dry_run_frames", default=DRY_RUN_FRAMES, type=int,
+                        help="number of frames exported by --dry_run")
     return parser
 
 
@@ -29,9 +85,55 @@ def build_args():
 #          skip_timestamp=None, skip_video=None, skip_ttl=None):
 def main():
     
-    args = build_args().parse_args()
+    parser = build_args()
+    args = parser.parse_args()
+    if (args.checkpoint > 0 or args.resume) and args.workers > 1:
+        parser.error("--checkpoint and --resume cannot be used with --workers")
+    if args.manifest is not None and args.workers > 1:
+        parser.error("--manifest cannot be used with --workers, use --jobs")
+    if args.profile and args.workers > 1:
+        parser.error("--profile cannot be used with --workers")
+    if args.dry_run and args.manifest is not None:
+        parser.error("--dry_run cannot be used with --manifest")
+    if args.dry_run and args.profile:
+        parser.error("--dry_run cannot be used with --profile (the dry run already reports the time per ROI type)")
     
-    if not args.use_cli:
+    # options shared by every export mode
+    export_kwargs = dict(pipeline=args.pipeline,
+                         num_workers=args.threads,
+                         ocr_backend=args.ocr_backend,
+                         ocr_cache_size=args.ocr_cache_size,
+                         glyph_ocr=args.glyph_ocr,
+                         predict_timestamp=args.predict_timestamp,
+                         anchor_interval=args.anchor_interval,
+                         ttl_format=args.ttl_format,
+                         ttl_events=args.ttl_events,
+                         video_writer=args.video_writer,
+                         video_fps=args.video_fps,
+                         video_codec=args.video_codec,
+                         video_crf=args.crf,
+                         video_preset=args.preset,
+                         histeq_interval=args.histeq_interval,
+                         histeq_reference=args.histeq_reference)
+    
+    if args.manifest is not None:
+        jobs = load_manifest(args.manifest,
+                             skip_timestamp=args.skip_timestamp,
+                             skip_video=args.skip_video,
+                             skip_ttl=args.skip_ttl)
+        results = run_batch(jobs, num_jobs=args.jobs,
+                            checkpoint=args.checkpoint,
+                            resume=args.resume,
+                            profile=args.profile,
+                            **export_kwargs)
+        save_summary(results, os.path.splitext(args.manifest)[0] + "_summary.csv")
+        num_failed = print_summary(results)
+        sys.exit(1 if num_failed > 0 else 0)
+    elif not args.use_cli:
+        # Qt is only loaded in GUI mode, the CLI runs without PyQt5/display
+        from PyQt5.QtWidgets import QApplication
+        from .gui import MainWindow
+
         app = QApplication(sys.argv)
         window = MainWindow()
         window.show()
@@ -42,12 +144,49 @@ def main():
 
         vobj = VideoReader(args.video)
         vobj.load_transforminfo(args.transform)
-        vobj.export_video(args.fout,
-                          skip_timestamp=args.skip_timestamp,
-                          skip_video=args.skip_video,
-                          skip_ttl=args.skip_ttl)
+        profiler = StageProfiler() if args.profile else None
+        if args.dry_run:
+            vobj.close()
+            estimate = estimate_export(args.video, vobj.transformer_set, args.fout,
+                                       num_frames=args.dry_run_frames,
+                                       workers=args.workers,
+                                       skip_timestamp=args.skip_timestamp,
+                                       skip_video=args.skip_video,
+                                       skip_ttl=args.skip_ttl,
+                                       **export_kwargs)
+            save_estimate(estimate, args.fout)
+            print(format_estimate(estimate))
+        elif args.workers > 1:
+            vobj.close()
+            export_video_chunked(args.video, vobj.transformer_set, args.fout,
+                                 workers=args.workers,
+                                 skip_timestamp=args.skip_timestamp,
+                                 skip_video=args.skip_video,
+                                 skip_ttl=args.skip_ttl,
+                                 **export_kwargs)
+        elif args.checkpoint > 0 or args.resume:
+            vobj.close()
+            export_video_checkpointed(args.video, vobj.transformer_set, args.fout,
+                                      checkpoint_interval=args.checkpoint or CHECKPOINT_INTERVAL,
+                                      resume=args.resume,
+                                      skip_timestamp=args.skip_timestamp,
+                                      skip_video=args.skip_video,
+                                      skip_ttl=args.skip_ttl,
+                                      profiler=profiler,
+                                      **export_kwargs)
+        else:
+            vobj.export_video(args.fout,
+                              skip_timestamp=args.skip_timestamp,
+                              skip_video=args.skip_video,
+                              skip_ttl=args.skip_ttl,
+                              profiler=profiler,
+                              **export_kwargs)
+
+        if profiler is not None:
+            profiler.save(args.fout)
+            print(profiler.format_report())
 
 
 if __name__ == "__main__":
     main()
-    # main(**vars(build_args().parse_args()))
\ No newline at end of file
+    # main(**vars(build_args().parse_args()))
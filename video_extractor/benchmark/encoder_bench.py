@@ -0,0 +1,92 @@
+"""
+Encode throughput of the video writer backends on this machine.
+
+    $ python -m video_extractor.benchmark.encoder_bench --size 1000 --frames 300
+
+Every available backend (ffmpeg/ffv1 need the ffmpeg executable) encodes the
+same synthetic frames; the encode rate and the output size are reported.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import cv2
+import numpy as np
+
+from ..processing.writers import open_video_writer, available_writers, FFMPEG_CODEC, FFMPEG_CRF, FFMPEG_PRESET
+
+
+def build_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", default=1000, type=int,
+                        help="frame width and height")
+    parser.add_argument("--frames", default=300, type=int,
+                        help="number of encoded frames per backend")
+    parser.add_argument("--fps", default=25, type=float,
+                        help="frame rate of the encoded videos")
+    parser.add_argument("--writers", default=None, nargs="+",
+                        help="backends to be measured (default: all available)")
+    parser.add_argument("--codec", default=FFMPEG_CODEC, type=str,
+                        help="codec of the ffmpeg backend")
+    parser.add_argument("--crf", default=FFMPEG_CRF, type=int)
+    parser.add_argument("--preset", default=FFMPEG_PRESET, type=str)
+    return parser
+
+
+def make_frames(size, num_frames=50):
+    # moving gradient with a blinking square and noise, roughly like an arena recording
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:size, 0:size]
+    frames = []
+    for i in range(num_frames):
+        frame = np.empty((size, size, 3), dtype=np.uint8)
+        frame[..., 0] = (x + 4*i) % 256
+        frame[..., 1] = (y + 2*i) % 256
+        frame[..., 2] = 128
+        if i % 10 < 5:
+            frame[size//8:size//4, size//8:size//4] = (0, 0, 255)
+        noise = rng.integers(-8, 9, frame.shape)
+        frames.append(np.clip(frame + noise, 0, 255).astype(np.uint8))
+    return frames
+
+
+def bench_writer(writer, frames, num_frames, fps, out_dir, **writer_kwargs):
+    fname = os.path.join(out_dir, "%s.avi"%(writer))
+    size = (frames[0].shape[1], frames[0].shape[0])
+    tic = time.perf_counter()
+    vw = open_video_writer(fname, size, fps, writer=writer, **writer_kwargs)
+    for i in range(num_frames):
+        vw.write(frames[i % len(frames)])
+    vw.close()
+    elapsed = time.perf_counter() - tic
+    return {
+        "fps": num_frames / elapsed,
+        "size_mb": os.path.getsize(fname) / 1e6,
+    }
+
+
+def main():
+    args = build_args().parse_args()
+    writers = args.writers or available_writers()
+    frames = make_frames(args.size)
+    print("OpenCV %s, %d threads, %dx%d, %d frames"%(cv2.__version__, cv2.getNumThreads(),
+                                                     args.size, args.size, args.frames))
+
+    out_dir = tempfile.mkdtemp(prefix="encoder_bench_")
+    try:
+        print("%-10s %10s %10s"%("writer", "fps", "MB"))
+        for writer in writers:
+            try:
+                res = bench_writer(writer, frames, args.frames, args.fps, out_dir,
+                                   codec=args.codec, crf=args.crf, preset=args.preset)
+            except Exception as e:
+                print("%-10s failed: %s"%(writer, e))
+                continue
+            print("%-10s %10.1f %10.2f"%(writer, res["fps"], res["size_mb"]))
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
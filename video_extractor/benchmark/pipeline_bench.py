@@ -0,0 +1,298 @@
+"""
+Frames/sec of every processing stage (decode, ROI transforms, TTL, OCR,
+encoding) and of the whole export on a synthetic video.
+
+    $ python -m video_extractor.benchmark.pipeline_bench --width 1280 --height 720 --frames 300 --json bench.json
+
+The results are written as JSON (with the commit, versions and options) so
+that runs can be compared across commits.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+from .. import __version__
+from ..processing.process_video import VideoReader, TransformInfo, VIDEO, TTL, TIME
+from ..processing.ocr import (
+    get_ocr_backend, parse_timestamp, read_timestamp, threshold_timestamp,
+    GlyphRecognizer, OCR_BACKENDS
+)
+from ..processing.writers import available_writers
+from .synthetic import make_synthetic_video, synthetic_timestamp, led_on, SYNTH_START, LED_PERIOD
+from .transform_bench import make_test_transforms, WARP_NAMES
+from .encoder_bench import bench_writer
+
+
+FRAME_POOL_SIZE = 50
+TTL_SIZE = 20
+
+
+def build_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", default=1280, type=int,
+                        help="width of the synthetic video")
+    parser.add_argument("--height", default=720, type=int,
+                        help="height of the synthetic video")
+    parser.add_argument("--frames", default=300, type=int,
+                        help="length of the synthetic video (frames measured per stage)")
+    parser.add_argument("--fps", default=25, type=float,
+                        help="frame rate of the synthetic video")
+    parser.add_argument("--size", default=500, type=int,
+                        help="output size of the video ROI")
+    parser.add_argument("--ocr_backend", default="auto", choices=OCR_BACKENDS,
+                        help="OCR engine to be measured")
+    parser.add_argument("--ocr_frames", default=50, type=int,
+                        help="number of frames read by the OCR engine")
+    parser.add_argument("--skip_ocr", action="store_true", default=False,
+                        help="do not measure OCR (and export without timestamp ROI)")
+    parser.add_argument("--json", default=None, type=str,
+                        help="output JSON file")
+    return parser
+
+
+def _git_commit():
+    try:
+        res = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return res.stdout.strip() if res.returncode == 0 else None
+    except OSError:
+        return None
+
+
+class _FrameCounter:
+    # progress bar replacement that only counts the exported frames
+    def __init__(self):
+        self.n = 0
+
+    def update(self, n=1):
+        self.n += n
+
+    def close(self):
+        pass
+
+
+def roi_transform(quad, width, height):
+    dst = np.array([[0, 0], [width-1, 0], [width-1, height-1], [0, height-1]], dtype="float32")
+    return TransformInfo(M=cv2.getPerspectiveTransform(quad, dst), max_width=width, max_height=height)
+
+
+def measure_frames(func, frames, num_frames):
+    # frames/sec of func over num_frames frames (cycling over frames)
+    func(frames[0])
+    tic = time.perf_counter()
+    for n in range(num_frames):
+        func(frames[n % len(frames)])
+    return num_frames / (time.perf_counter() - tic)
+
+
+def bench_decode(video):
+    vobj = VideoReader(video)
+    try:
+        vobj.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        num_frames = 0
+        tic = time.perf_counter()
+        while vobj.read_raw_frame() is not None:
+            num_frames += 1
+        return {"fps": num_frames / (time.perf_counter() - tic), "frames": num_frames}
+    finally:
+        vobj.close()
+
+
+def load_frames(video, num_frames=FRAME_POOL_SIZE):
+    cap = cv2.VideoCapture(video)
+    frames = []
+    while len(frames) < num_frames:
+        sucess, frame = cap.read()
+        if not sucess:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def bench_transforms(frames, num_frames, size):
+    height, width = frames[0].shape[:2]
+    trans_set = make_test_transforms(width, height, size)
+    # brightness/contrast/histeq on top of the perspective warp
+    adjust = make_test_transforms(width, height, size)[4]
+    adjust.brightness, adjust.contrast, adjust.histeq = 10, 1.2, True
+    trans_set.append(adjust)
+    # same with the equalization mapping of a reference frame
+    adjust_ref = make_test_transforms(width, height, size)[4]
+    adjust_ref.brightness, adjust_ref.contrast, adjust_ref.histeq = 10, 1.2, True
+    adjust_ref.set_histeq_reference(frames[0])
+    trans_set.append(adjust_ref)
+
+    res = {}
+    for n, trans in enumerate(trans_set):
+        name = WARP_NAMES[trans.warp_kind]
+        if trans is adjust:
+            name += "_adjust"
+        elif trans is adjust_ref:
+            name += "_adjust_ref"
+        elif trans.max_width == 20:
+            name += "_led"
+        while name in res:
+            name += "_%d"%(n)
+        res[name] = measure_frames(trans.transform, frames, num_frames)
+    return res
+
+
+def bench_ttl(frames, num_frames, layout):
+    trans = roi_transform(layout["led"], TTL_SIZE, TTL_SIZE)
+    fps = measure_frames(trans.mean_color, frames, num_frames)
+    # the LED must be found in the red channel
+    values = np.array([trans.mean_color(frame) for frame in frames])
+    expected = np.array([led_on(n, LED_PERIOD) for n in range(len(frames))])
+    red = values[:, 2] > values[:, 2].mean()
+    return {"fps": fps, "led_accuracy": float((red == expected).mean())}
+
+
+def bench_ocr(frames, num_frames, layout, ocr_backend, fps):
+    w, h = layout["timestamp_size"]
+    trans = roi_transform(layout["timestamp"], w, h)
+    crops = [trans.transform(frame) for frame in frames]
+    expected = [synthetic_timestamp(SYNTH_START, n, fps) for n in range(len(frames))]
+
+    res = {}
+    try:
+        ocr = get_ocr_backend(ocr_backend)
+        ocr.image_to_string(threshold_timestamp(crops[0]))
+    except Exception as e:
+        return {"error": "%s: %s"%(type(e).__name__, e)}
+
+    def accuracy(ocr):
+        correct = 0
+        for crop, text in zip(crops, expected):
+            dt = read_timestamp(threshold_timestamp(crop), ocr=ocr)
+            correct += dt is not None and dt.strftime("%y:%m:%d/%H:%M:%S.%f")[:-3] == text
+        return correct / len(crops)
+
+    res[ocr.name] = {"fps": measure_frames(lambda crop: parse_timestamp(crop, ocr=ocr), crops, num_frames),
+                     "accuracy": accuracy(ocr)}
+    # template matching after calibration on the first frames
+    glyph = GlyphRecognizer(ocr)
+    accuracy(glyph)
+    res["glyph"] = {"fps": measure_frames(lambda crop: parse_timestamp(crop, ocr=glyph), crops, len(crops)),
+                    "accuracy": accuracy(glyph)}
+    return res
+
+
+def bench_encode(frames, num_frames, size, fps, out_dir):
+    height, width = frames[0].shape[:2]
+    trans = make_test_transforms(width, height, size)[4]
+    warped = [trans.transform(frame) for frame in frames]
+    res = {}
+    for writer in available_writers():
+        try:
+            res[writer] = bench_writer(writer, warped, num_frames, fps, out_dir)
+        except Exception as e:
+            res[writer] = {"error": "%s: %s"%(type(e).__name__, e)}
+    return res
+
+
+def bench_export(video, frames, layout, size, out_dir, ocr_backend, skip_ocr):
+    height, width = frames[0].shape[:2]
+    trans_video = make_test_transforms(width, height, size)[4]
+    trans_video.type = VIDEO
+    trans_ttl = roi_transform(layout["led"], TTL_SIZE, TTL_SIZE)
+    trans_ttl.type = TTL
+    w, h = layout["timestamp_size"]
+    trans_time = roi_transform(layout["timestamp"], w, h)
+    trans_time.type = TIME
+
+    res = {}
+    for pipeline in (False, True):
+        for with_ocr in (False, True):
+            if with_ocr and skip_ocr:
+                continue
+            name = ("pipeline" if pipeline else "serial") + ("" if with_ocr else "_no_ocr")
+            vobj = VideoReader(video)
+            vobj.transformer_set = [trans_video, trans_ttl, trans_time]
+            counter = _FrameCounter()
+            try:
+                tic = time.perf_counter()
+                vobj.export_video(os.path.join(out_dir, name), progbar=lambda **kwargs: counter, pipeline=pipeline,
+                                  skip_timestamp=not with_ocr, ocr_backend=ocr_backend, ocr_cache_size=0)
+                res[name] = counter.n / (time.perf_counter() - tic)
+            except Exception as e:
+                res[name] = {"error": "%s: %s"%(type(e).__name__, e)}
+            finally:
+                vobj.close()
+    return res
+
+
+def run_benchmark(width=1280, height=720, num_frames=300, fps=25, size=500,
+                  ocr_backend="auto", ocr_frames=50, skip_ocr=False, progbar=tqdm):
+    out_dir = tempfile.mkdtemp(prefix="pipeline_bench_")
+    try:
+        video = os.path.join(out_dir, "synthetic.avi")
+        layout = make_synthetic_video(video, width, height, num_frames, fps)
+        frames = load_frames(video)
+
+        stages = [
+            ("decode", lambda: bench_decode(video)),
+            ("transform", lambda: bench_transforms(frames, num_frames, size)),
+            ("ttl", lambda: bench_ttl(frames, num_frames, layout)),
+            ("ocr", lambda: bench_ocr(frames, ocr_frames, layout, ocr_backend, fps)),
+            ("encode", lambda: bench_encode(frames, num_frames, size, fps, out_dir)),
+            ("export", lambda: bench_export(video, frames, layout, size, out_dir, ocr_backend, skip_ocr)),
+        ]
+        if skip_ocr:
+            stages = [stage for stage in stages if stage[0] != "ocr"]
+
+        res = {}
+        for name, func in progbar(stages, desc="Benchmark"):
+            res[name] = func()
+        return res
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def _print_results(res, indent=0):
+    for key, value in res.items():
+        if isinstance(value, dict):
+            print(" "*indent + "%s:"%(key))
+            _print_results(value, indent + 2)
+        elif isinstance(value, float):
+            print(" "*indent + "%-20s %10.2f"%(key, value))
+        else:
+            print(" "*indent + "%-20s %10s"%(key, value))
+
+
+def main():
+    args = build_args().parse_args()
+    results = run_benchmark(args.width, args.height, args.frames, args.fps, args.size,
+                            ocr_backend=args.ocr_backend, ocr_frames=args.ocr_frames,
+                            skip_ocr=args.skip_ocr)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "version": __version__,
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "cpu_count": os.cpu_count(),
+            "options": vars(args),
+        },
+        "results": results,
+    }
+    _print_results(results)
+    if args.json is not None:
+        with open(args.json, "w") as fp:
+            json.dump(report, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
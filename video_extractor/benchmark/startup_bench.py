@@ -0,0 +1,80 @@
+"""
+Cold-start time of the CLI (new interpreter per run) and a check that the
+CLI and the processing package do not import Qt.
+
+    $ python -m video_extractor.benchmark.startup_bench --repeat 5 --max_seconds 1.5
+
+The exit code is 1 if Qt is imported by the CLI or if the median start-up
+time of the CLI is above --max_seconds.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+
+# python code run in a fresh interpreter for every target
+TARGETS = {
+    "python": "pass",
+    "processing": "import video_extractor.processing",
+    "cli": "import sys; sys.argv = ['extract_video', '--help']\n"
+           "import video_extractor.__main__ as m\n"
+           "try:\n    m.main()\nexcept SystemExit:\n    pass",
+}
+QT_CHECK = ("import sys; import video_extractor.__main__, video_extractor.processing.parallel, "
+            "video_extractor.processing.batch; "
+            "print(','.join(sorted(m for m in sys.modules if m.split('.')[0] in ('PyQt5', 'PyQt6', 'PySide2', 'PySide6') "
+            "or m.startswith('video_extractor.gui'))))")
+
+
+def build_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", default=5, type=int,
+                        help="number of runs per target (the median is reported)")
+    parser.add_argument("--max_seconds", default=None, type=float,
+                        help="fail if the median CLI start-up time is above this")
+    parser.add_argument("--json", default=None, type=str,
+                        help="output JSON file")
+    return parser
+
+
+def cold_start(code, repeat=5):
+    times = []
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - tic)
+    return {"median": statistics.median(times), "min": min(times), "max": max(times)}
+
+
+def gui_modules_imported():
+    res = subprocess.run([sys.executable, "-c", QT_CHECK], check=True, capture_output=True, text=True)
+    return [m for m in res.stdout.strip().split(",") if m]
+
+
+def main():
+    args = build_args().parse_args()
+    results = {name: cold_start(code, args.repeat) for name, code in TARGETS.items()}
+    gui_modules = gui_modules_imported()
+
+    for name, res in results.items():
+        print("%-12s median %.3f sec (min %.3f, max %.3f)"%(name, res["median"], res["min"], res["max"]))
+    print("GUI modules imported by the CLI: %s"%(", ".join(gui_modules) if gui_modules else "none"))
+
+    ok = len(gui_modules) == 0
+    if args.max_seconds is not None and results["cli"]["median"] > args.max_seconds:
+        print("CLI start-up is slower than %.3f sec"%(args.max_seconds))
+        ok = False
+
+    if args.json is not None:
+        with open(args.json, "w") as fp:
+            json.dump({"results": results, "gui_modules": gui_modules,
+                       "max_seconds": args.max_seconds, "ok": ok}, fp, indent=2)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
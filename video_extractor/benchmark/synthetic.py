@@ -0,0 +1,103 @@
+"""
+Deterministic synthetic recordings for the benchmarks: a textured background,
+a blinking coloured LED in the top-left corner and a putText timestamp
+(TIMESTAMP_FORMAT, ms precision) at the bottom.
+
+    $ python -m video_extractor.benchmark.synthetic synth.avi --width 1280 --height 720 --frames 500
+"""
+import argparse
+import cv2
+import numpy as np
+from datetime import datetime, timedelta
+
+from ..processing.ocr import TIMESTAMP_FORMAT
+
+
+SYNTH_START = datetime(2025, 1, 2, 10, 0, 0)
+SYNTH_FOURCC = "MJPG"
+LED_PERIOD = 20
+LED_COLOR = (0, 0, 255)
+
+
+def _rect(x0, y0, x1, y1):
+    return np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], dtype="float32")
+
+
+def synthetic_layout(width, height):
+    """
+    Position of the LED and the timestamp in a synthetic frame. The LED and
+    timestamp quads can be used as ROIs (TransformInfo) directly.
+    """
+    s = max(min(width, height)//12, 8)
+    led = (s//2, s//2, s//2 + s, s//2 + s)
+
+    font_scale = max(height / 720, 0.4)
+    thickness = max(int(round(2*font_scale)), 1)
+    text = synthetic_timestamp(SYNTH_START, 0, 25)
+    (tw, th), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+    x0, y0 = s//2, height - s//2 - th - baseline
+    pad = thickness + 2
+    return {
+        "led": _rect(*led),
+        "led_box": led,
+        "timestamp": _rect(x0 - pad, y0 - pad, x0 + tw + pad, y0 + th + baseline + pad),
+        "timestamp_size": (tw + 2*pad, th + baseline + 2*pad),
+        "text_org": (x0, y0 + th),
+        "font_scale": font_scale,
+        "thickness": thickness,
+    }
+
+
+def synthetic_timestamp(start, n, fps):
+    return (start + timedelta(seconds=n / fps)).strftime(TIMESTAMP_FORMAT)[:-3]
+
+
+def led_on(n, period=LED_PERIOD):
+    return (n % period) < period // 2
+
+
+def make_synthetic_video(fname, width=1280, height=720, num_frames=500, fps=25,
+                         led_period=LED_PERIOD, led_color=LED_COLOR, seed=0,
+                         start=SYNTH_START, fourcc=SYNTH_FOURCC):
+    """
+    Write a synthetic video and return its layout (see synthetic_layout).
+    The same arguments always give the same frames.
+    """
+    layout = synthetic_layout(width, height)
+    rng = np.random.default_rng(seed)
+    # smooth texture with some per-frame sensor noise
+    background = cv2.GaussianBlur(rng.integers(0, 120, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    noise = rng.integers(0, 8, (8, height, width, 3), dtype=np.uint8)
+
+    writer = cv2.VideoWriter(fname, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height))
+    if not writer.isOpened():
+        raise ValueError("Cannot open the writable video file")
+    x0, y0, x1, y1 = layout["led_box"]
+    try:
+        for n in range(num_frames):
+            frame = cv2.add(background, noise[n % len(noise)])
+            if led_on(n, led_period):
+                frame[y0:y1, x0:x1] = led_color
+            cv2.putText(frame, synthetic_timestamp(start, n, fps), layout["text_org"],
+                        cv2.FONT_HERSHEY_SIMPLEX, layout["font_scale"], (255, 255, 255),
+                        layout["thickness"], cv2.LINE_AA)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return layout
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("fname", type=str)
+    parser.add_argument("--width", default=1280, type=int)
+    parser.add_argument("--height", default=720, type=int)
+    parser.add_argument("--frames", default=500, type=int)
+    parser.add_argument("--fps", default=25, type=float)
+    parser.add_argument("--seed", default=0, type=int)
+    args = parser.parse_args()
+    make_synthetic_video(args.fname, args.width, args.height, args.frames, args.fps, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
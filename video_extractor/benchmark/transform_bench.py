@@ -0,0 +1,177 @@
+"""
+Micro-benchmark of TransformInfo.warp (cached fixed-point remap maps)
+against cv2.warpPerspective with the same matrix.
+
+    $ python -m video_extractor.benchmark.transform_bench --size 1000
+
+With --check, every warp class (crop, scale, affine, perspective) is
+compared with cv2.warpPerspective and the exit code is 1 if one of them
+differs by more than the tolerance, if a class is not taken by any test
+transform, or if the crop reaches the video writer as a non-contiguous view.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+
+from ..processing.process_video import (
+    TransformInfo, VideoSink, order_points,
+    WARP_CROP, WARP_SCALE, WARP_AFFINE, WARP_PERSPECTIVE
+)
+
+
+WARP_NAMES = {WARP_CROP: "crop", WARP_SCALE: "scale", WARP_AFFINE: "affine", WARP_PERSPECTIVE: "perspective"}
+MAX_MEAN_DIFF = 0.5
+
+
+def build_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", default=1000, type=int,
+                        help="output width and height")
+    parser.add_argument("--width", default=1920, type=int,
+                        help="source frame width")
+    parser.add_argument("--height", default=1080, type=int,
+                        help="source frame height")
+    parser.add_argument("--repeat", default=200, type=int,
+                        help="number of transformed frames per method")
+    parser.add_argument("--check", action="store_true", default=False,
+                        help="check that every warp class matches warpPerspective")
+    return parser
+
+
+def make_transform(width, height, size):
+    # slightly tilted quad in the middle of the frame
+    pts = order_points([(0.20*width, 0.15*height), (0.75*width, 0.10*height),
+                        (0.80*width, 0.90*height), (0.25*width, 0.85*height)])
+    dst = np.array([[0, 0], [size-1, 0], [size-1, size-1], [0, size-1]], dtype="float32")
+    return TransformInfo(M=cv2.getPerspectiveTransform(pts, dst), max_width=size, max_height=size)
+
+
+def measure(func, frame, repeat):
+    func(frame)
+    tic = time.perf_counter()
+    for _ in range(repeat):
+        func(frame)
+    return repeat / (time.perf_counter() - tic)
+
+
+def bench_remap(width=1920, height=1080, size=1000, repeat=200):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    trans = make_transform(width, height, size)
+
+    def warp_perspective(frame):
+        return cv2.warpPerspective(frame, trans.M, (trans.max_width, trans.max_height))
+
+    tic = time.perf_counter()
+    trans.warp(frame)
+    build_time = time.perf_counter() - tic
+
+    diff = np.abs(warp_perspective(frame).astype(int) - trans.warp(frame).astype(int))
+    return {
+        "warpPerspective_fps": measure(warp_perspective, frame, repeat),
+        "remap_fps": measure(trans.warp, frame, repeat),
+        "map_build_sec": build_time,
+        "max_abs_diff": int(diff.max()),
+        "mean_abs_diff": float(diff.mean()),
+    }
+
+
+def make_test_transforms(width, height, size):
+    rect = lambda x0, y0, x1, y1: np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], dtype="float32")
+    dst = rect(0, 0, size-1, size-1)
+    
+    trans_set = []
+    # integer rectangle of the output size
+    x0, y0 = max(width - size, 0)//2, max(height - size, 0)//2
+    trans_set.append(cv2.getPerspectiveTransform(rect(x0, y0, x0+size-1, y0+size-1), dst))
+    # exact 2x upscale (cv2.resize)
+    trans_set.append(np.array([[2, 0, 0.5-2*x0], [0, 2, 0.5-2*y0], [0, 0, 1]]))
+    # rectangle tool with fractional corners
+    trans_set.append(cv2.getPerspectiveTransform(rect(10.3, 20.7, 0.6*width+0.2, 0.9*height+0.4), dst))
+    # rotated rectangle
+    rot = cv2.getRotationMatrix2D((width/2, height/2), 15, 0.8)
+    rot[:, 2] -= (width/2 - size/2, height/2 - size/2)
+    trans_set.append(np.vstack([rot, [0, 0, 1]]))
+    # tilted quad
+    trans_set.append(make_transform(width, height, size).M)
+    trans_set = [TransformInfo(M=M, max_width=size, max_height=size) for M in trans_set]
+    
+    # small LED-like quad, partly outside of the frame
+    led = np.array([[-3.5, 5.2], [17.1, 4.0], [18.3, 21.7], [-2.2, 23.9]], dtype="float32")
+    trans_set.append(TransformInfo(M=cv2.getPerspectiveTransform(led, rect(0, 0, 19, 19)),
+                                   max_width=20, max_height=20))
+    return trans_set
+
+
+def check_warp_kinds(width=1920, height=1080, size=1000):
+    # smooth test image: textures of natural video rather than pixel noise
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(frame, (0, 0), 2)
+    
+    res = []
+    for trans in make_test_transforms(width, height, size):
+        ref = cv2.warpPerspective(frame, trans.M, (trans.max_width, trans.max_height)).astype(int)
+        diff = np.abs(ref - trans.warp(frame).astype(int))
+        res.append({
+            "kind": WARP_NAMES[trans.warp_kind],
+            "path": WARP_NAMES[trans._warp[1]],
+            "max_abs_diff": int(diff.max()),
+            "mean_abs_diff": float(diff.mean()),
+            "ok": bool(diff.mean() <= MAX_MEAN_DIFF),
+            "fps": measure(trans.warp, frame, 50),
+            "warpPerspective_fps": measure(
+                lambda f: cv2.warpPerspective(f, trans.M, (trans.max_width, trans.max_height)), frame, 50),
+        })
+    return res
+
+
+def check_crop_contiguous(width=1920, height=1080, size=1000):
+    # the crop path returns a view of the frame, VideoSink has to hand a contiguous copy to the writer
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    trans = make_test_transforms(width, height, size)[0]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sink = VideoSink(trans, os.path.join(tmp_dir, "crop.avi"))
+        try:
+            warp = sink.process(frame)
+            sink.write(0, warp)
+        finally:
+            sink.close()
+    return {
+        "view": not trans.warp(frame).flags["C_CONTIGUOUS"],
+        "ok": bool(warp.flags["C_CONTIGUOUS"]) and not np.shares_memory(warp, frame),
+    }
+
+
+def main():
+    args = build_args().parse_args()
+    
+    if args.check:
+        res = check_warp_kinds(args.width, args.height, args.size)
+        for r in res:
+            print("%-12s (%-11s): max %d, mean %.3f  %-4s  %8.1f frames/sec (warpPerspective: %.1f)"
+                  %(r["kind"], r["path"], r["max_abs_diff"], r["mean_abs_diff"],
+                    "ok" if r["ok"] else "FAIL", r["fps"], r["warpPerspective_fps"]))
+        # every class has to be checked on its own path
+        missing = [name for name in WARP_NAMES.values()
+                   if not any(r["kind"] == name and r["path"] == name for r in res)]
+        if missing:
+            print("FAIL: no test transform takes the %s path"%(", ".join(missing)))
+        crop = check_crop_contiguous(args.width, args.height, args.size)
+        print("crop to VideoSink (%s): %s"%("view" if crop["view"] else "copy", "ok" if crop["ok"] else "FAIL, not contiguous"))
+        sys.exit(0 if all(r["ok"] for r in res) and not missing and crop["ok"] else 1)
+    
+    res = bench_remap(args.width, args.height, args.size, args.repeat)
+    print("source %dx%d -> output %dx%d"%(args.width, args.height, args.size, args.size))
+    print("warpPerspective: %8.1f frames/sec"%(res["warpPerspective_fps"]))
+    print("cached remap   : %8.1f frames/sec (maps built in %.3f sec)"%(res["remap_fps"], res["map_build_sec"]))
+    # maps are quantized to 1/32 pixel (same as OpenCV's fixed-point warp)
+    print("abs difference: max %d, mean %.3f"%(res["max_abs_diff"], res["mean_abs_diff"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,17 +3,20 @@ from PyQt5.QtWidgets import (
     QSizePolicy, QPushButton, QFormLayout, QGroupBox, QDoubleSpinBox, QCheckBox, QRadioButton, QComboBox,
     QHBoxLayout
 )
-from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtCore import pyqtSignal, QTimer
+import cv2
+import numpy as np
 from .scene_panel import ScencePanel
 from .utils_gui import error2messagebox
+from ..processing.process_video import TransformInfo, VIDEO, TTL, TIME
 # from .video_panel import VideoPanel
 
 
 cprefix = ["crop_", "ttl_", "time_"]
-
-VIDEO = 0
-TTL = 1
-TIME = 2
+# ms without a value change before the preview is updated
+PREVIEW_DELAY = 30
+# maximum size of the preview in the transform panel
+PREVIEW_MAX_SIZE = 720
 
 
 class cItem(QPushButton):
@@ -174,13 +177,24 @@ class TransformPanel(QWidget):
         self.init_frame = frame
         self.frame = self.init_frame.copy()
         self.ctrl_fields = dict()
+        self.ctrl_defaults = dict()
         self.ctrl_value = None
         self.init_ui()
+        
+        # live preview on a copy downscaled to the view, Apply/Add use the full frame
+        h, w = frame.shape[:2]
+        size = self.scene.proxy_size(w, h)
+        self.proxy = frame if size == (w, h) else cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        self.preview_trans = TransformInfo(M=np.eye(3), max_width=size[0], max_height=size[1])
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DELAY)
+        self.preview_timer.timeout.connect(self._update_preview)
     
     def init_ui(self):
         layout = QHBoxLayout()
         
-        self.scene = ScencePanel()
+        self.scene = ScencePanel(max_width=PREVIEW_MAX_SIZE, max_height=PREVIEW_MAX_SIZE)
         self.scene.update_scene(self.init_frame)
         layout.addWidget(self.scene)
         
@@ -231,38 +245,56 @@ class TransformPanel(QWidget):
     
     @error2messagebox(to_warn=True)
     def _add_transform(self, *args):
-        if self.ctrl_value is None:
-            raise ValueError("Please apply the change first")
-        
         value = self.cb_type.currentData()
         if value == -1:
             raise ValueError("Please select exporting type")
         
+        # the values in the panel are applied to the full frame
+        self._read_value()
         self.signal_trans_add.emit(value)
         
     def _add_dspinbox(self, layout: QFormLayout, key, vmin=-50, vmax=50, vdefault=0):
         obj = QDoubleSpinBox()
         obj.setRange(vmin, vmax)
         obj.setValue(vdefault)
+        obj.valueChanged.connect(self._schedule_preview)
         layout.addRow(key, obj)
         self.ctrl_fields[key] = (obj, "dspin")
+        self.ctrl_defaults[key] = vdefault
         
     def _add_checkbox(self, layout: QVBoxLayout, key):
         obj = QCheckBox(key)
+        obj.stateChanged.connect(self._schedule_preview)
         layout.addWidget(obj)
         self.ctrl_fields[key] = (obj, "checkbox")
         
-    def _read_value(self):
-        self.ctrl_value = dict()
+    def _get_values(self):
+        value = dict()
         for key in self.ctrl_fields.keys():
             obj, obj_type = self.ctrl_fields[key]
             if obj_type == "dspin":
-                self.ctrl_value[key] = obj.value()
+                value[key] = obj.value()
             elif obj_type == "checkbox":
-                self.ctrl_value[key] = obj.isChecked()
+                value[key] = obj.isChecked()
             else:
                 raise ValueError("Unknown type in control panel")
+        return value
+        
+    def _read_value(self):
+        self.preview_timer.stop()
+        self.ctrl_value = self._get_values()
         self.signal_trans_update.emit(self.ctrl_value)
+    
+    def _schedule_preview(self, *args):
+        # restarted on every change, the preview follows once the values settle
+        self.preview_timer.start()
+    
+    def _update_preview(self):
+        value = self._get_values()
+        self.preview_trans.brightness = value.get("Brightness", 0)
+        self.preview_trans.contrast = value.get("Contrast", 1)
+        self.preview_trans.histeq = value.get("Histnorm", False)
+        self.scene.update_scene(self.preview_trans.adjust(self.proxy))
         
     def update_scene(self, frame):
         self.scene.update_scene(frame)
@@ -272,11 +304,12 @@ class TransformPanel(QWidget):
         for key in self.ctrl_fields.keys():
             obj, obj_type = self.ctrl_fields[key]
             if obj_type == "dspin":
-                obj.setValue(0)
+                obj.setValue(self.ctrl_defaults[key])
             elif obj_type == "checkbox":
                 obj.setCheckState(0)
             else:
                 raise ValueError("Unknown type in control panel")
+        self.preview_timer.stop()
         self.frame = self.init_frame.copy()
         self.scene.update_scene(self.frame)
 
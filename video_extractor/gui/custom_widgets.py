@@ -1,10 +1,10 @@
 from PyQt5.QtWidgets import (
     QVBoxLayout, QLabel, QGraphicsLineItem, QGraphicsEllipseItem, QGraphicsItem,
-    QCheckBox, QMessageBox, QDialogButtonBox, QDialog
+    QCheckBox, QMessageBox, QDialogButtonBox, QDialog, QPushButton
 )
 
-from PyQt5.QtGui import QPen
-from PyQt5.QtCore import Qt, QPointF, QObject
+from PyQt5.QtGui import QPen, QFont
+from PyQt5.QtCore import Qt, QPointF, QObject, pyqtSignal
 
 MAKE_SQUARE = False
 RADIUS = 10
@@ -152,6 +152,9 @@ class DotLinkInteractor(QObject):
 
 
 class ExportOptionDialog(QDialog):
+    # the dry run (estimate of the export time and sizes) is run by the parent
+    dry_run_requested = pyqtSignal()
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Select Data Types to Export")
@@ -173,6 +176,17 @@ class ExportOptionDialog(QDialog):
         layout.addWidget(self.chk_ttl)
         layout.addWidget(self.chk_timestamp)
 
+        self.chk_profile = QCheckBox("Profile export stages (<prefix>_profile.txt)")
+        layout.addWidget(self.chk_profile)
+
+        self.button_dry_run = QPushButton("Dry run (estimate time and size)")
+        self.button_dry_run.clicked.connect(self.dry_run_requested.emit)
+        layout.addWidget(self.button_dry_run)
+        self.text_estimate = QLabel("")
+        self.text_estimate.setFont(QFont("Monospace"))
+        self.text_estimate.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        layout.addWidget(self.text_estimate)
+
         # Add OK/Cancel buttons
         self.buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
         self.buttons.accepted.connect(self.accept)
@@ -185,8 +199,13 @@ class ExportOptionDialog(QDialog):
         return {
             "video": self.chk_video.isChecked(),
             "ttl": self.chk_ttl.isChecked(),
-            "timestamp": self.chk_timestamp.isChecked()
+            "timestamp": self.chk_timestamp.isChecked(),
+            "profile": self.chk_profile.isChecked()
         }
+
+    def set_estimate(self, text):
+        self.text_estimate.setText(text)
+        self.adjustSize()
         
         
 def set_is_square(is_square):
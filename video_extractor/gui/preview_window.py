@@ -0,0 +1,65 @@
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel
+from PyQt5.QtCore import pyqtSignal
+
+from .scene_panel import ScencePanel
+from ..processing.preview import PreviewPlayer
+
+
+class PreviewWindow(QWidget):
+    """
+    Plays the video with all ROIs side by side to check that they track the
+    recording before exporting. Decoding and transforms run on the player
+    thread, this window only shows the newest mosaic.
+    """
+    # emitted from the player thread
+    frame_ready = pyqtSignal()
+
+    def __init__(self, file_path, transformer_set, start_frame=0):
+        super().__init__()
+        self.setWindowTitle("ROI preview")
+        self.player = PreviewPlayer(file_path, transformer_set, notify=self.frame_ready.emit,
+                                    start_frame=start_frame)
+        self.frame_ready.connect(self._show_frame)
+        self.init_ui()
+        self.player.start()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+
+        self.scene = ScencePanel(enable_selection=False)
+        layout.addWidget(self.scene)
+
+        layout_ctrl = QHBoxLayout()
+        self.button_play = QPushButton("Pause")
+        self.button_play.clicked.connect(self.toggle_play)
+        self.text_fps = QLabel("")
+        layout_ctrl.addWidget(self.button_play)
+        layout_ctrl.addWidget(self.text_fps)
+        layout.addLayout(layout_ctrl)
+
+        self.setLayout(layout)
+
+    def toggle_play(self):
+        if self.player.is_playing():
+            self.player.stop()
+            self.button_play.setText("Play")
+        else:
+            if self.player.finished:
+                # from the beginning
+                self.player.frame_index = 0
+            self.player.start()
+            self.button_play.setText("Pause")
+
+    def _show_frame(self):
+        item = self.player.take()
+        if item is not None:
+            n, mosaic = item
+            self.scene.update_scene(mosaic)
+            self.text_fps.setText("frame %d | %d / %.1f fps | dropped %d"
+                                  %(n, self.player.fps, self.player.target_fps, self.player.dropped))
+        if self.player.finished:
+            self.button_play.setText("Play")
+
+    def closeEvent(self, event):
+        self.player.stop()
+        super().closeEvent(event)
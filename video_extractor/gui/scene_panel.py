@@ -5,6 +5,7 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtGui import QPixmap, QImage, QFontMetrics, QPen
 from PyQt5.QtCore import Qt, QRectF
 from .custom_widgets import DraggableDot, DotLinkInteractor, RADIUS
+import cv2
 
 
 MAX_WIDTH = 1600
@@ -12,13 +13,16 @@ MAX_HEIGHT = 1080
 
 
 class ScencePanel(QGraphicsView):
-    def __init__(self, enable_selection=True):
+    def __init__(self, enable_selection=True, max_width=MAX_WIDTH, max_height=MAX_HEIGHT):
         super().__init__()
         self._scene = QGraphicsScene()
         self.setScene(self._scene)
         self.setMinimumSize(640, 480)
         self.enable_selection = enable_selection
+        self.max_width = max_width
+        self.max_height = max_height
         self.frame_size = None
+        self.pixmap_item = None
         if self.enable_selection:
             self.pen = QPen(Qt.red, 2)
             self.rect_link = DotLinkInteractor(self)
@@ -29,21 +33,28 @@ class ScencePanel(QGraphicsView):
     
     def clear_scene(self):
         self._scene.clear()
+        self.pixmap_item = None
         
     def update_scene(self, frame):
-        self.clear_scene()
-        
+        # frames are kept in the decoder's BGR order, convert only for display
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         h, w, ch = frame.shape
         bytes_per_line = ch * w
         qimg = QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
         pixmap = QPixmap.fromImage(qimg)
-        pixmap_item = QGraphicsPixmapItem(pixmap)
-        self._scene.addItem(pixmap_item)
+        
+        # the frame item is reused, the selected points stay on top of it
+        if self.pixmap_item is None:
+            self.pixmap_item = QGraphicsPixmapItem(pixmap)
+            self.pixmap_item.setZValue(-1)
+            self._scene.addItem(self.pixmap_item)
+        else:
+            self.pixmap_item.setPixmap(pixmap)
         
         # resize view to fit image
         if self.frame_size is None:
-            r1 = MAX_WIDTH/w if w > MAX_WIDTH else 1
-            r2 = MAX_HEIGHT/h if h > MAX_HEIGHT else 1
+            r1 = self.max_width/w if w > self.max_width else 1
+            r2 = self.max_height/h if h > self.max_height else 1
             r = min(r1, r2)
             
             wr = int(w*r)
@@ -52,11 +63,18 @@ class ScencePanel(QGraphicsView):
             self.setMaximumSize(wr, hr)
         
         self.setSceneRect(QRectF(pixmap.rect()))
-        self.fitInView(pixmap_item, Qt.KeepAspectRatio)
+        self.fitInView(self.pixmap_item, Qt.KeepAspectRatio)
         
         if self.frame_size is None:
             self.setFixedSize(wr, hr)
             self.frame_size = (wr, hr)
+    
+    def proxy_size(self, w, h):
+        # size of a frame downscaled to the view (never upscaled)
+        if self.frame_size is None:
+            return w, h
+        r = min(self.frame_size[0]/w, self.frame_size[1]/h, 1)
+        return max(int(w*r), 1), max(int(h*r), 1)
         
     def reset_sel(self):
         self.clear_points()
@@ -103,7 +121,7 @@ class ScencePanel(QGraphicsView):
         return super().mousePressEvent(event)
     
     def mouseMoveEvent(self, event):
-        if self.is_rect:
+        if self.enable_selection and self.is_rect:
             self.rect_link.handle_mouse_move(event)
             super().mouseMoveEvent(event)
 
@@ -1,8 +1,14 @@
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QLabel, QProgressBar, QApplication, QMessageBox, QProgressBar
-from PyQt5.QtCore import Qt, QElapsedTimer, QTimer
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QLabel, QProgressBar, QApplication, QMessageBox, QPushButton
+from PyQt5.QtCore import Qt, QElapsedTimer, QTimer, QThread, pyqtSignal
+import threading
+import time
 import traceback
 
 
+# minimum seconds between progress updates (<= 10 Hz)
+PROGRESS_INTERVAL = 0.1
+
+
 def error2messagebox(to_warn=False):
     def decorator(func):
         def wrapper(*args, **kwargs):
@@ -21,11 +27,21 @@ def error2messagebox(to_warn=False):
 
 
 class tqdm_qt(QDialog):
+    """
+    Progress dialog. It is either used as progbar on the GUI thread (update is
+    throttled to PROGRESS_INTERVAL) or fed by ExportWorker.progress through
+    set_progress. Cancel emits canceled while an export is running.
+    """
+    canceled = pyqtSignal()
+    
     def __init__(self, total=0, desc="Processing...", parent=None, **kwargs):
         super().__init__(parent)
         self.total = total
         self.desc = desc
         self.n = 0
+        self.profiler = None
+        self.running = True
+        self._last_update = 0
 
         self.elapsed_timer = QElapsedTimer()
         self.timer_ui = QTimer(self)
@@ -41,14 +57,17 @@ class tqdm_qt(QDialog):
         self.progress_bar = QProgressBar()
         self.progress_bar.setRange(0, self.total)
         self.label_time = QLabel("0:00 / ??:??")
+        self.button_cancel = QPushButton("Cancel")
+        self.button_cancel.clicked.connect(self.reject)
 
         layout.addWidget(self.label_desc)
         layout.addWidget(self.progress_bar)
         layout.addWidget(self.label_time)
+        layout.addWidget(self.button_cancel)
 
         self.setLayout(layout)
         self.setWindowModality(Qt.ApplicationModal)
-        self.setFixedSize(400, 100)
+        self.setFixedSize(400, 130)
 
         self.elapsed_timer.start()
         self.timer_ui.start(1000)
@@ -57,6 +76,11 @@ class tqdm_qt(QDialog):
 
     def update(self, n=1):
         self.n += n
+        # repainting on every frame would slow down the export
+        now = time.perf_counter()
+        if now - self._last_update < PROGRESS_INTERVAL and self.n < self.total:
+            return
+        self._last_update = now
         self.progress_bar.setValue(self.n)
         self.update_time_label()
         QApplication.processEvents()
@@ -64,6 +88,14 @@ class tqdm_qt(QDialog):
         if self.n >= self.total:
             self.close()
 
+    def set_progress(self, n, total):
+        if total != self.total:
+            self.total = total
+            self.progress_bar.setRange(0, total)
+        self.n = n
+        self.progress_bar.setValue(n)
+        self.update_time_label()
+
     def update_time_label(self):
         elapsed_ms = self.elapsed_timer.elapsed()
         elapsed_s = elapsed_ms / 1000
@@ -75,6 +107,79 @@ class tqdm_qt(QDialog):
 
         text = f"left: {format_time(total_est-elapsed_s)} / total: {format_time(total_est)}"
         self.label_time.setText(text)
+        if self.profiler is not None:
+            self.label_profile.setText(self.profiler.format_breakdown())
+
+    def set_profiler(self, profiler):
+        # show the most expensive export stages below the progress bar
+        self.profiler = profiler
+        self.label_profile = QLabel("")
+        self.layout().insertWidget(self.layout().count() - 1, self.label_profile)
+        self.setFixedSize(400, 230)
+
+    def reject(self):
+        # Cancel, Esc and the close button stop the export instead of hiding the dialog
+        if self.running:
+            self.button_cancel.setEnabled(False)
+            self.label_desc.setText("Cancelling...")
+            self.canceled.emit()
+        else:
+            super().reject()
 
     def close(self):
-        self.timer_ui.stop()
\ No newline at end of file
+        self.timer_ui.stop()
+        self.running = False
+        super().close()
+
+
+class _SignalProgress:
+    # progbar for export_video on a worker thread: emits (n, total) at most
+    # every PROGRESS_INTERVAL seconds
+    def __init__(self, signal, total=0):
+        self.signal = signal
+        self.total = total
+        self.n = 0
+        self._last_emit = 0
+
+    def update(self, n=1):
+        self.n += n
+        now = time.perf_counter()
+        if now - self._last_emit >= PROGRESS_INTERVAL:
+            self._last_emit = now
+            self.signal.emit(self.n, self.total)
+
+    def close(self):
+        self.signal.emit(self.n, self.total)
+
+
+class ExportWorker(QThread):
+    """
+    Runs export(progbar=..., cancel_event=...) off the GUI thread, e.g. a
+    partial of VideoReader.export_video. Its return value is kept in result,
+    finished_export carries it as bool (False if cancelled), failed the error
+    message.
+    """
+    progress = pyqtSignal(int, int)
+    finished_export = pyqtSignal(bool)
+    failed = pyqtSignal(str)
+
+    def __init__(self, export, parent=None):
+        super().__init__(parent)
+        self.export = export
+        self.cancel_event = threading.Event()
+        self.result = None
+
+    def progbar(self, total=0, desc=None, **kwargs):
+        return _SignalProgress(self.progress, total)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            self.result = self.export(progbar=self.progbar, cancel_event=self.cancel_event)
+        except Exception as e:
+            print(traceback.format_exc())
+            self.failed.emit(str(e))
+            return
+        self.finished_export.emit(bool(self.result))
\ No newline at end of file
@@ -1,20 +1,23 @@
 from PyQt5.QtWidgets import (
         QVBoxLayout, QHBoxLayout,
-        QToolButton, QLabel, QWidget, QFileDialog, QMessageBox
+        QToolButton, QLabel, QWidget, QFileDialog, QMessageBox, QSlider
 )
 
 from PyQt5.QtGui import QFontMetrics
 from PyQt5.QtCore import Qt, pyqtSignal
 
 # from ..processing import VideoReader
-from ..processing.process_video import VideoReader
+from ..processing.process_video import VideoReader, VIDEO, TTL, TIME, FPS
+from ..processing.profiler import StageProfiler
+from ..processing.estimate import estimate_export, format_estimate
+from ..processing.frame_cache import FrameDecoder
 from .control_panel import ControllPanel, TransformPanel
-from .utils_gui import error2messagebox, tqdm_qt
+from .utils_gui import error2messagebox, tqdm_qt, ExportWorker
 from .custom_widgets import ExportOptionDialog, set_is_square
 from .scene_panel import ScencePanel
+from .preview_window import PreviewWindow
 import os
-
-from ..gui.control_panel import VIDEO, TTL, TIME
+from functools import partial
 
 
 
@@ -23,12 +26,21 @@ from ..gui.control_panel import VIDEO, TTL, TIME
 class VideoPanel(QWidget):
     
     add_crop_success = pyqtSignal(int)
+    # (decoder id, frame index, frame), emitted from the decoder thread and
+    # delivered in the GUI thread
+    frame_decoded = pyqtSignal(int, int, object)
     
     def __init__(self):
         super().__init__()
         self.init_ui()
         self.video_reader = None # VideoReader()
         self.trans_panel = None # Transformpanel
+        self.frame_decoder = None # FrameDecoder for the timeline
+        self.export_worker = None # ExportWorker while exporting
+        self.preview_window = None # PreviewWindow
+        self.frame_index = 0
+        self.decoder_id = 0
+        self.frame_decoded.connect(self._on_frame_decoded)
      
     def init_ui(self):
         # entire layout
@@ -42,6 +54,10 @@ class VideoPanel(QWidget):
         self.scene_panel = ScencePanel()
         layout.addWidget(self.scene_panel)
         
+        # timeline
+        layout_timeline = self.init_ui_timeline()
+        layout.addLayout(layout_timeline)
+        
         self.setLayout(layout)
     
     def init_ui_control_panel(self):
@@ -52,11 +68,76 @@ class VideoPanel(QWidget):
         self.button_load.setText("📁")
         self.button_load.clicked.connect(self._open_file_dialog)
         
+        self.button_preview = QToolButton()
+        self.button_preview.setText("Preview ROIs")
+        self.button_preview.clicked.connect(self.preview_rois)
+        
         layout.addWidget(self.button_load)
         layout.addWidget(self.text_load)
+        layout.addWidget(self.button_preview)
 
         return layout
     
+    def init_ui_timeline(self):
+        layout = QHBoxLayout()
+        self.slider_frame = QSlider(Qt.Horizontal)
+        self.slider_frame.setRange(0, 0)
+        self.slider_frame.valueChanged.connect(self._request_frame)
+        self.text_frame = QLabel("0 / 0")
+        
+        # step by one frame or by one second
+        self.button_steps = []
+        for text, step, in_sec in (("⏪", -1, True), ("◀", -1, False), ("▶", 1, False), ("⏩", 1, True)):
+            button = QToolButton()
+            button.setText(text)
+            button.setAutoRepeat(True)
+            button.clicked.connect(lambda _, step=step, in_sec=in_sec: self._step_frame(step, in_sec))
+            self.button_steps.append(button)
+        
+        for button in self.button_steps[:2]:
+            layout.addWidget(button)
+        layout.addWidget(self.slider_frame)
+        for button in self.button_steps[2:]:
+            layout.addWidget(button)
+        layout.addWidget(self.text_frame)
+        self._enable_timeline(False)
+        
+        return layout
+    
+    def _enable_timeline(self, enable):
+        self.slider_frame.setEnabled(enable)
+        for button in self.button_steps:
+            button.setEnabled(enable)
+    
+    def _step_frame(self, step, in_sec=False):
+        if in_sec and self.frame_decoder is not None:
+            step = int(round(step * (self.frame_decoder.fps or FPS)))
+        self.slider_frame.setValue(self.slider_frame.value() + step)
+    
+    def _request_frame(self, n):
+        # never decodes in the GUI thread: cached frames are shown at once,
+        # others are shown when the decoder thread delivers them
+        if self.frame_decoder is None:
+            return
+        frame = self.frame_decoder.get(n)
+        if frame is not None:
+            self._show_decoded_frame(n, frame)
+        self.frame_decoder.request(n)
+    
+    def _on_frame_decoded(self, decoder_id, n, frame):
+        # frames still queued from the decoder of a previous file are dropped
+        if decoder_id == self.decoder_id:
+            self._show_decoded_frame(n, frame)
+    
+    def _show_decoded_frame(self, n, frame):
+        if self.frame_decoder is None or n == self.frame_index:
+            return
+        self.frame_index = n
+        self.text_frame.setText("%d / %d"%(n, self.frame_decoder.num_frames - 1))
+        # the selected points are kept while scrubbing
+        self.video_reader.set_frame(frame)
+        self.scene_panel.update_scene(frame)
+    
     def _open_file_dialog(self):
         filename, _ = QFileDialog.getOpenFileName(self, 
                                                   "Select video file", "",
@@ -73,10 +154,40 @@ class VideoPanel(QWidget):
         self.text_load.setText(elided_text)
         
         # read video file
+        if self.frame_decoder is not None:
+            self.frame_decoder.close()
+            self.frame_decoder = None
         self.video_reader = VideoReader(filename)
         frame = self.video_reader.read_frame()
         self.scene_panel.update_scene(frame)
         
+        # frames of the timeline are decoded in the background
+        self.decoder_id += 1
+        self.frame_decoder = FrameDecoder(filename, callback=lambda n, frame, decoder_id=self.decoder_id:
+                                          self.frame_decoded.emit(decoder_id, n, frame))
+        self.frame_decoder.cache.put(0, frame)
+        self.frame_index = 0
+        self.slider_frame.blockSignals(True)
+        self.slider_frame.setRange(0, max(self.frame_decoder.num_frames - 1, 0))
+        self.slider_frame.setValue(0)
+        self.slider_frame.blockSignals(False)
+        self.text_frame.setText("0 / %d"%(self.frame_decoder.num_frames - 1))
+        self._enable_timeline(True)
+        self.frame_decoder.request(0)
+        
+    @error2messagebox(to_warn=True)
+    def preview_rois(self):
+        """
+        Play the video with all added ROIs from the current timeline frame
+        """
+        if self.video_reader is None:
+            raise ValueError("Set video image first")
+        if self.preview_window is not None:
+            self.preview_window.close()
+        self.preview_window = PreviewWindow(self.videofile, self.video_reader.transformer_set,
+                                            start_frame=self.frame_index)
+        self.preview_window.show()
+        
     def connect_controllser(self, controller: ControllPanel):
         controller.reset_selected.connect(self.reset_crop)
         controller.add_selected.connect(self.transform_crop)
@@ -128,17 +239,74 @@ class VideoPanel(QWidget):
         
         # show popup to be exported
         dialog = ExportOptionDialog(self)
+        dialog.dry_run_requested.connect(partial(self.dry_run_export, prefix, dialog))
         if dialog.exec_():
             selection = dialog.get_selection()
         else:
             return
         
-        done = self.video_reader.export_video(prefix, tqdm_qt,
-                                              skip_video=not selection["video"],
-                                              skip_ttl=not selection["ttl"],
-                                              skip_timestamp=not selection["timestamp"])
+        # the export runs on a worker thread, the dialog only receives throttled progress
+        profiler = StageProfiler() if selection["profile"] else None
+        export = partial(self.video_reader.export_video, prefix,
+                         skip_video=not selection["video"],
+                         skip_ttl=not selection["ttl"],
+                         skip_timestamp=not selection["timestamp"],
+                         profiler=profiler)
+        self.export_worker = ExportWorker(export, self)
+        self.export_dialog = tqdm_qt(desc="Exporting video", parent=self)
+        if profiler is not None:
+            self.export_dialog.set_profiler(profiler)
+        self.export_worker.progress.connect(self.export_dialog.set_progress)
+        self.export_dialog.canceled.connect(self.export_worker.cancel)
+        self.export_worker.finished_export.connect(partial(self._export_finished, prefix, profiler))
+        self.export_worker.failed.connect(self._export_failed)
+        self.export_worker.start()
+    
+    @error2messagebox(to_warn=True)
+    def dry_run_export(self, prefix, dialog):
+        # export a sample of frames with the selected datasets and show the estimate in the dialog
+        selection = dialog.get_selection()
+        estimate = partial(estimate_export, self.video_reader.file_path,
+                           self.video_reader.transformer_set, prefix,
+                           skip_video=not selection["video"],
+                           skip_ttl=not selection["ttl"],
+                           skip_timestamp=not selection["timestamp"])
+        self.export_worker = ExportWorker(estimate, self)
+        self.export_dialog = tqdm_qt(desc="Dry run", parent=dialog)
+        self.export_worker.progress.connect(self.export_dialog.set_progress)
+        self.export_dialog.canceled.connect(self.export_worker.cancel)
+        self.export_worker.finished_export.connect(partial(self._dry_run_finished, dialog))
+        self.export_worker.failed.connect(self._export_failed)
+        self.export_worker.start()
+
+    def _dry_run_finished(self, dialog, done):
+        estimate = self.export_worker.result
+        self._close_export()
+        if done:
+            text = format_estimate(estimate)
+            print(text)
+            dialog.set_estimate(text)
+
+    def _close_export(self):
+        self.export_worker.wait()
+        self.export_worker = None
+        self.export_dialog.close()
+    
+    def _export_finished(self, prefix, profiler, done):
+        num_frames = self.export_dialog.n
+        self._close_export()
+        if profiler is not None:
+            profiler.save(prefix)
+            print(profiler.format_report())
         if done:
             QMessageBox.information(self, "Done", "Video export finished!")
+        else:
+            QMessageBox.information(self, "Cancelled",
+                                    "Video export cancelled, the outputs contain the first %d frames"%(num_frames))
+    
+    def _export_failed(self, message):
+        self._close_export()
+        QMessageBox.warning(None, "Warning", message)
 
     @error2messagebox(to_warn=True)
     def apply_crop(self, is_apply: int):
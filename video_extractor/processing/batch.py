@@ -0,0 +1,185 @@
+import csv
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout, redirect_stderr
+from tqdm import tqdm
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from .process_video import VideoReader
+from .checkpoint import export_video_checkpointed, CHECKPOINT_INTERVAL
+from .profiler import StageProfiler
+
+
+NUM_JOBS = 1
+# seconds between progress lines in the job logs
+LOG_INTERVAL = 30
+MANIFEST_COLUMNS = ("video", "transform", "fout")
+SKIP_OPTIONS = ("skip_timestamp", "skip_video", "skip_ttl")
+SUMMARY_COLUMNS = ("video", "fout", "status", "frames", "wall_time", "fps", "error")
+
+
+def _parse_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y")
+    return bool(value)
+
+
+def load_manifest(fname, skip_timestamp=False, skip_video=False, skip_ttl=False):
+    """
+    Read export jobs from a csv, json or yaml file. Every job has video,
+    transform and fout (same as the CLI options) and optionally the skip_*
+    options (the given skip_* options apply to every job). Relative paths are
+    resolved from the directory of the manifest.
+    """
+    defaults = dict(skip_timestamp=skip_timestamp, skip_video=skip_video, skip_ttl=skip_ttl)
+    ext = os.path.splitext(fname)[1].lower()
+    with open(fname, "r", newline='') as fp:
+        if ext == ".csv":
+            jobs = list(csv.DictReader(fp))
+        elif ext == ".json":
+            jobs = json.load(fp)
+        elif ext in (".yaml", ".yml"):
+            if yaml is None:
+                raise ImportError("pyyaml is not installed, please run: pip install pyyaml")
+            jobs = yaml.safe_load(fp)
+        else:
+            raise ValueError("Unknown manifest format: %s"%(fname))
+
+    if isinstance(jobs, dict):
+        jobs = jobs.get("jobs")
+    if not isinstance(jobs, list):
+        raise ValueError("The manifest must be a list of jobs: %s"%(fname))
+
+    root = os.path.dirname(os.path.abspath(fname))
+    out = []
+    for n, job in enumerate(jobs):
+        missing = [key for key in MANIFEST_COLUMNS if not job.get(key)]
+        if len(missing) > 0:
+            raise ValueError("Job %d in %s has no %s"%(n, fname, ", ".join(missing)))
+        item = {key: os.path.normpath(os.path.join(root, os.path.expanduser(str(job[key]))))
+                for key in MANIFEST_COLUMNS}
+        for key in SKIP_OPTIONS:
+            item[key] = _parse_bool(job.get(key) or False) or defaults[key]
+        out.append(item)
+    return out
+
+
+def done_marker(prefix):
+    return prefix + "_done.json"
+
+
+def _run_job(job, checkpoint=0, resume=False, profile=False, export_kwargs=None):
+    # runs in a worker process, everything printed goes to the job log
+    result = dict(video=job["video"], fout=job["fout"], status="failed",
+                  frames=0, wall_time=0., fps=0., error="")
+    kwargs = dict(export_kwargs or {})
+    kwargs.update({key: job[key] for key in SKIP_OPTIONS})
+    profiler = StageProfiler() if profile else None
+
+    out_dir = os.path.dirname(os.path.abspath(job["fout"]))
+    os.makedirs(out_dir, exist_ok=True)
+
+    bars = []
+    tic = time.perf_counter()
+    with open(job["fout"] + "_export.log", "w") as fp, redirect_stdout(fp), redirect_stderr(fp):
+        def progbar(**bar_kwargs):
+            bar = tqdm(file=fp, mininterval=LOG_INTERVAL, **bar_kwargs)
+            bars.append(bar)
+            return bar
+
+        try:
+            vobj = VideoReader(job["video"])
+            try:
+                vobj.load_transforminfo(job["transform"])
+                if checkpoint > 0 or resume:
+                    vobj.close()
+                    export_video_checkpointed(job["video"], vobj.transformer_set, job["fout"],
+                                              checkpoint_interval=checkpoint or CHECKPOINT_INTERVAL,
+                                              resume=resume, progbar=progbar, profiler=profiler, **kwargs)
+                else:
+                    vobj.export_video(job["fout"], progbar=progbar, profiler=profiler, **kwargs)
+            finally:
+                vobj.close()
+            result["status"] = "done"
+            if profiler is not None:
+                profiler.save(job["fout"])
+                print(profiler.format_report())
+        except Exception as e:
+            traceback.print_exc()
+            result["error"] = "%s: %s"%(type(e).__name__, e)
+
+    result["wall_time"] = time.perf_counter() - tic
+    result["frames"] = sum(bar.n - bar.initial for bar in bars)
+    result["fps"] = result["frames"] / result["wall_time"] if result["wall_time"] > 0 else 0.
+
+    if result["status"] == "done":
+        with open(done_marker(job["fout"]), "w") as fp:
+            json.dump(result, fp, indent=2)
+    return result
+
+
+def run_batch(jobs, num_jobs=NUM_JOBS, progbar=tqdm, checkpoint=0, resume=False, profile=False,
+              **export_kwargs):
+    """
+    Run export jobs with a process pool (num_jobs jobs at a time). A failed job
+    does not stop the batch, and jobs that have a done marker (<fout>_done.json)
+    from a previous run are skipped.
+    """
+    results = [None] * len(jobs)
+    pending = []
+    for n, job in enumerate(jobs):
+        if os.path.exists(done_marker(job["fout"])):
+            results[n] = dict(video=job["video"], fout=job["fout"], status="skipped",
+                              frames=0, wall_time=0., fps=0., error="")
+        else:
+            pending.append(n)
+
+    pbar = progbar(total=len(jobs), initial=len(jobs) - len(pending), desc="Exporting videos")
+    try:
+        with ProcessPoolExecutor(max_workers=num_jobs) as pool:
+            futures = {pool.submit(_run_job, jobs[n], checkpoint, resume, profile, export_kwargs): n
+                       for n in pending}
+            for future in as_completed(futures):
+                n = futures[future]
+                try:
+                    results[n] = future.result()
+                except Exception as e:
+                    # the worker process died (e.g. killed or out of memory)
+                    results[n] = dict(video=jobs[n]["video"], fout=jobs[n]["fout"], status="failed",
+                                      frames=0, wall_time=0., fps=0., error="%s: %s"%(type(e).__name__, e))
+                pbar.update(n=1)
+    finally:
+        pbar.close()
+
+    return results
+
+
+def save_summary(results, fname):
+    with open(fname, "w", newline='') as fp:
+        writer = csv.DictWriter(fp, fieldnames=SUMMARY_COLUMNS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow(result)
+
+
+def print_summary(results):
+    print("%-8s %10s %10s %8s  %s"%("status", "frames", "time (s)", "fps", "output"))
+    for result in results:
+        print("%-8s %10d %10.1f %8.1f  %s"%(result["status"], result["frames"], result["wall_time"],
+                                           result["fps"], result["fout"]))
+        if result["error"]:
+            print("         %s"%(result["error"]))
+
+    num_failed = sum(result["status"] == "failed" for result in results)
+    print("%d jobs: %d done, %d skipped, %d failed"%(len(results),
+                                                    sum(result["status"] == "done" for result in results),
+                                                    sum(result["status"] == "skipped" for result in results),
+                                                    num_failed))
+    return num_failed
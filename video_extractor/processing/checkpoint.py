@@ -0,0 +1,136 @@
+import cv2
+import hashlib
+import json
+import os
+import pickle as pkl
+import shutil
+from tqdm import tqdm
+
+from .process_video import VideoReader, FPS
+from .merge import merge_outputs, check_video_merge
+
+
+# frames between checkpoints (10 min at 25 fps)
+CHECKPOINT_INTERVAL = 15000
+CHECKPOINT_STATE = "state.json"
+# export_video options that change the outputs: a checkpoint is only resumed with the same values
+OUTPUT_OPTIONS = ("ocr_backend", "glyph_ocr", "predict_timestamp", "anchor_interval",
+                  "video_writer", "video_fps", "video_codec", "video_crf", "video_preset",
+                  "histeq_interval", "histeq_reference")
+
+
+def checkpoint_dir(prefix):
+    return prefix + "_checkpoint"
+
+
+class _SegmentProgress:
+    # forwards the progress of one segment to the progress bar of the whole export
+    def __init__(self, pbar):
+        self.pbar = pbar
+        self.n = 0
+
+    def update(self, n=1):
+        self.n += n
+        self.pbar.update(n=n)
+
+    def close(self):
+        pass
+
+
+def _digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def _load_state(fname):
+    with open(fname, "r") as fp:
+        return json.load(fp)
+
+
+def _save_state(state, fname):
+    # replace the state file atomically, an interrupted write keeps the previous checkpoint
+    with open(fname + ".tmp", "w") as fp:
+        json.dump(state, fp, indent=2)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(fname + ".tmp", fname)
+
+
+def export_video_checkpointed(video, transformer_set, prefix,
+                              checkpoint_interval=CHECKPOINT_INTERVAL, resume=False,
+                              progbar=tqdm, skip_timestamp=False, skip_video=False, skip_ttl=False,
+                              ttl_format="csv", ttl_events=False, **export_kwargs):
+    """
+    Export the video in segments of checkpoint_interval frames. Every finished
+    segment is recorded in <prefix>_checkpoint/state.json, so that an interrupted
+    export continues from the last finished segment with resume=True. The
+    segments are merged into the usual output files at the end.
+    """
+    if checkpoint_interval <= 0:
+        raise ValueError("Invalid checkpoint interval: %d"%(checkpoint_interval))
+    check_video_merge(transformer_set, skip_video=skip_video)
+
+    vobj = VideoReader(video)
+    vobj.transformer_set = transformer_set
+    try:
+        frame_num = int(vobj.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = vobj.cap.get(cv2.CAP_PROP_FPS) or FPS
+        output_options = {key: export_kwargs.get(key) for key in OUTPUT_OPTIONS}
+        # the equalization mapping is resolved once (and saved) for all parts
+        vobj.set_histeq(export_kwargs.pop("histeq_interval", None), export_kwargs.pop("histeq_reference", None))
+
+        ckpt_dir = checkpoint_dir(prefix)
+        state_file = os.path.join(ckpt_dir, CHECKPOINT_STATE)
+        options = dict(video=os.path.basename(video), frame_num=frame_num,
+                       skip_timestamp=skip_timestamp, skip_video=skip_video, skip_ttl=skip_ttl,
+                       ttl_format=ttl_format, ttl_events=ttl_events,
+                       transform=_digest(pkl.dumps(transformer_set)),
+                       export=_digest(json.dumps(output_options, sort_keys=True).encode()))
+
+        if resume and os.path.exists(state_file):
+            state = _load_state(state_file)
+            if state["options"] != options:
+                changed = sorted(key for key in options if state["options"].get(key) != options[key])
+                raise ValueError("The checkpoint in %s was made with different export options (%s)"
+                                 %(ckpt_dir, ", ".join(changed)))
+            print("Resume export from frame %d (%d segments done)"%(state["next_frame"], len(state["segments"])))
+        else:
+            if resume:
+                print("There is no checkpoint in %s, export from the first frame"%(ckpt_dir))
+            shutil.rmtree(ckpt_dir, ignore_errors=True)
+            os.makedirs(ckpt_dir)
+            state = dict(options=options, segments=[], next_frame=0, finished=False)
+            _save_state(state, state_file)
+        vobj.save_transform(prefix)
+
+        export_kwargs.update(skip_timestamp=skip_timestamp,
+                             skip_video=skip_video,
+                             skip_ttl=skip_ttl,
+                             ttl_format=ttl_format)
+
+        pbar = progbar(total=frame_num, initial=state["next_frame"], desc="Exporting video")
+        try:
+            while not state["finished"]:
+                start_frame = state["next_frame"]
+                seg_name = "segment%06d"%(len(state["segments"]))
+                progress = _SegmentProgress(pbar)
+                vobj.export_video(os.path.join(ckpt_dir, seg_name), progbar=lambda **kwargs: progress,
+                                  start_frame=start_frame, end_frame=start_frame + checkpoint_interval,
+                                  **export_kwargs)
+
+                # a short segment means that the decoder reached the end of the video
+                if progress.n > 0:
+                    state["segments"].append(seg_name)
+                state["next_frame"] = start_frame + progress.n
+                state["finished"] = progress.n < checkpoint_interval
+                _save_state(state, state_file)
+        finally:
+            pbar.close()
+    finally:
+        vobj.close()
+
+    merge_outputs(transformer_set, [os.path.join(ckpt_dir, s) for s in state["segments"]], prefix, fps,
+                  skip_timestamp=skip_timestamp, skip_video=skip_video, skip_ttl=skip_ttl,
+                  ttl_format=ttl_format, ttl_events=ttl_events)
+    shutil.rmtree(ckpt_dir, ignore_errors=True)
+
+    return True
@@ -0,0 +1,161 @@
+import cv2
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from tqdm import tqdm
+
+from .process_video import VideoReader
+from .profiler import StageProfiler, DECODE
+from .parallel import split_frames
+from .checkpoint import _SegmentProgress
+
+
+# frames exported by a dry run, split into DRY_RUN_SEGMENTS runs of consecutive frames
+DRY_RUN_FRAMES = 250
+DRY_RUN_SEGMENTS = 5
+
+
+def sample_segments(frame_num, num_frames=DRY_RUN_FRAMES, num_segments=DRY_RUN_SEGMENTS, seed=0):
+    """
+    Stratified sample of [0, frame_num): the frames are split into num_segments
+    equal strata and a run of consecutive frames is taken at a random position
+    in each of them (runs keep the OCR cache, timestamp anchors and the
+    encoder in their usual regime).
+    """
+    if frame_num <= num_frames:
+        return [(0, frame_num)]
+    run = max(num_frames // num_segments, 1)
+    rng = np.random.default_rng(seed)
+    segments = []
+    for start, end in split_frames(frame_num, num_segments):
+        length = min(run, end - start)
+        start += int(rng.integers(0, end - start - length + 1))
+        segments.append((start, start + length))
+    return segments
+
+
+def estimate_export(video, transformer_set, prefix, num_frames=DRY_RUN_FRAMES,
+                    num_segments=DRY_RUN_SEGMENTS, workers=1, seed=0, progbar=tqdm,
+                    cancel_event=None, **export_kwargs):
+    """
+    Dry run of an export: a stratified sample of frames (sample_segments) goes
+    through every ROI and sink with the given export options, into a temporary
+    directory next to prefix. The measured frames/sec, time shares and output
+    sizes are extrapolated to the whole video. OCR caches start empty in every
+    segment, so the estimate errs on the slow side. Returns None if cancelled
+    with cancel_event.
+    """
+    vobj = VideoReader(video)
+    vobj.transformer_set = transformer_set
+    try:
+        frame_num = int(vobj.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if frame_num <= 0:
+            raise ValueError("Cannot read the number of frames of %s"%(video))
+        segments = sample_segments(frame_num, num_frames, num_segments, seed)
+        vobj.set_histeq(export_kwargs.pop("histeq_interval", None), export_kwargs.pop("histeq_reference", None))
+
+        out_dir = os.path.dirname(os.path.abspath(prefix))
+        tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(prefix)+"_dry_run_", dir=out_dir)
+        profiler = StageProfiler()
+        sizes = dict()
+        pbar = progbar(total=sum(end - start for start, end in segments), desc="Dry run")
+        try:
+            for i, (start, end) in enumerate(segments):
+                seg_dir = os.path.join(tmp_dir, "segment%02d"%(i))
+                os.makedirs(seg_dir)
+                progress = _SegmentProgress(pbar)
+                done = vobj.export_video(os.path.join(seg_dir, "out"), progbar=lambda **kwargs: progress,
+                                         start_frame=start, end_frame=end, profiler=profiler,
+                                         cancel_event=cancel_event, **export_kwargs)
+                if not done:
+                    return None
+
+                # output size per file (the transform file does not grow with the video)
+                for fname in os.listdir(seg_dir):
+                    suffix = fname[len("out"):]
+                    if suffix != "_trans_option.pkl":
+                        sizes[suffix] = sizes.get(suffix, 0) + os.path.getsize(os.path.join(seg_dir, fname))
+                shutil.rmtree(seg_dir, ignore_errors=True)
+        finally:
+            pbar.close()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    finally:
+        vobj.close()
+
+    report = profiler.report()
+    if report["frames"] == 0:
+        raise ValueError("No frame could be read for the dry run")
+    scale = frame_num / report["frames"]
+
+    # time per ROI type (all ROIs of a type together) and of OCR
+    stage_seconds = sum(row["seconds"] for row in report["stages"])
+    roi_types = dict()
+    for row in report["stages"]:
+        name = "decode" if row["roi"] == DECODE else row["roi"].split(":", 1)[1]
+        entry = roi_types.setdefault(name, {"rois": set(), "seconds": 0.})
+        entry["rois"].add(row["roi"])
+        entry["seconds"] += row["seconds"]
+    for entry in roi_types.values():
+        entry["rois"] = len(entry["rois"])
+        entry["fps"] = report["frames"] / entry["seconds"] if entry["seconds"] > 0 else None
+        entry["percent"] = 100 * entry["seconds"] / stage_seconds if stage_seconds > 0 else 0.
+    ocr_seconds = sum(row["seconds"] for row in report["stages"] if row["stage"] == "ocr")
+
+    # chunked exports (workers > 1) at best scale with the number of cores
+    parallel = max(min(workers, os.cpu_count() or 1), 1)
+    outputs = {prefix + suffix: int(size * scale) for suffix, size in sorted(sizes.items())}
+    return {
+        "video": video,
+        "frame_num": frame_num,
+        "sampled_frames": report["frames"],
+        "segments": segments,
+        "sample_seconds": report["wall_time"],
+        "fps": report["fps"],
+        "workers": workers,
+        "estimated_seconds": report["wall_time"] * scale / parallel,
+        "ocr_percent": 100 * ocr_seconds / stage_seconds if stage_seconds > 0 else 0.,
+        "peak_rss_mb": report["peak_rss_mb"],
+        "roi_types": roi_types,
+        "outputs": outputs,
+        "output_bytes": sum(outputs.values()),
+        "free_bytes": shutil.disk_usage(os.path.dirname(os.path.abspath(prefix))).free,
+    }
+
+
+def _format_seconds(seconds):
+    seconds = int(round(seconds))
+    return "%d:%02d:%02d"%(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+def _format_bytes(size):
+    if size < 2**20:
+        return "%.1f KB"%(size / 2**10)
+    if size < 2**30:
+        return "%.1f MB"%(size / 2**20)
+    return "%.2f GB"%(size / 2**30)
+
+
+def format_estimate(estimate):
+    lines = ["Dry run: %d of %d frames in %.1f sec (%.1f frames/sec)"
+             %(estimate["sampled_frames"], estimate["frame_num"], estimate["sample_seconds"], estimate["fps"] or 0),
+             "Estimated export time: %s (%d workers), OCR %.1f%% of the processing time"
+             %(_format_seconds(estimate["estimated_seconds"]), estimate["workers"], estimate["ocr_percent"]),
+             "%-10s %5s %12s %7s"%("roi type", "rois", "frames/sec", "%")]
+    for name, entry in estimate["roi_types"].items():
+        lines.append("%-10s %5d %12s %6.1f%%"
+                     %(name, entry["rois"], "%.1f"%(entry["fps"]) if entry["fps"] is not None else "-",
+                       entry["percent"]))
+    lines.append("Estimated output size:")
+    for fname, size in estimate["outputs"].items():
+        lines.append("  %s: %s"%(fname, _format_bytes(size)))
+    lines.append("  total: %s (%s free)"%(_format_bytes(estimate["output_bytes"]), _format_bytes(estimate["free_bytes"])))
+    if estimate["output_bytes"] > estimate["free_bytes"]:
+        lines.append("Warning: the outputs do not fit on the disk")
+    return "\n".join(lines)
+
+
+def save_estimate(estimate, prefix):
+    with open(prefix + "_dry_run.json", "w") as fp:
+        json.dump(estimate, fp, indent=2)
@@ -0,0 +1,150 @@
+import threading
+from collections import OrderedDict
+import cv2
+
+
+# memory of the decoded frames kept by FrameDecoder (~85 frames of 1080p)
+FRAME_CACHE_BYTES = 512 * 2**20
+# frames decoded ahead of (and half as many behind) the requested frame
+PREFETCH_FRAMES = 25
+# assumed keyframe (GOP) interval: seeks start at a multiple of it
+KEYFRAME_INTERVAL = 25
+
+
+class FrameCache:
+    """
+    LRU cache of decoded frames (frame index -> frame) bounded by memory.
+    """
+    def __init__(self, max_bytes=FRAME_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, n):
+        with self._lock:
+            frame = self._frames.get(n)
+            if frame is not None:
+                self._frames.move_to_end(n)
+            return frame
+
+    def put(self, n, frame):
+        with self._lock:
+            old = self._frames.pop(n, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._frames[n] = frame
+            self.nbytes += frame.nbytes
+            # the newest frame is always kept, even if it is larger than max_bytes
+            while self.nbytes > self.max_bytes and len(self._frames) > 1:
+                _, old = self._frames.popitem(last=False)
+                self.nbytes -= old.nbytes
+
+    def __contains__(self, n):
+        with self._lock:
+            return n in self._frames
+
+    def __len__(self):
+        return len(self._frames)
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.nbytes = 0
+
+
+class FrameDecoder:
+    """
+    Random access to the frames of a video for the GUI timeline. Frames are
+    decoded on a background thread into a FrameCache, request() never blocks.
+
+    Only the newest request is served (older pending requests are dropped) and
+    callback(n, frame) is called from the decoder thread once it is decoded.
+    Seeks snap to a multiple of keyframe_interval and decode forward to the
+    requested frame, so the frames in between are cached as well; targets
+    shortly after the current position are reached by decoding forward
+    without seeking. While idle, prefetch frames after (and prefetch//2
+    before) the last request are decoded.
+    """
+    def __init__(self, file_path, callback=None, cache_bytes=FRAME_CACHE_BYTES,
+                 prefetch=PREFETCH_FRAMES, keyframe_interval=KEYFRAME_INTERVAL):
+        self.cap = cv2.VideoCapture(file_path)
+        if not self.cap.isOpened():
+            raise FileExistsError(f"Cannot open video file: {file_path}")
+        self.num_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.callback = callback
+        self.cache = FrameCache(cache_bytes)
+        self.prefetch = prefetch
+        self.keyframe_interval = max(int(keyframe_interval), 1)
+
+        self._pos = 0  # index of the frame returned by the next cap.read()
+        self._target = None
+        self._stop = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def get(self, n):
+        # cached frame or None
+        return self.cache.get(n)
+
+    def request(self, n):
+        with self._cond:
+            self._target = min(max(int(n), 0), max(self.num_frames - 1, 0))
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        self._thread.join()
+        self.cache.clear()
+
+    def _pending(self):
+        return self._stop or self._target is not None
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    while self._target is None and not self._stop:
+                        self._cond.wait()
+                    if self._stop:
+                        break
+                    n, self._target = self._target, None
+
+                frame = self._decode(n)
+                if frame is not None and self.callback is not None:
+                    self.callback(n, frame)
+                self._prefetch(n)
+        finally:
+            self.cap.release()
+
+    def _prefetch(self, n):
+        ahead = range(n + 1, min(n + self.prefetch, self.num_frames - 1) + 1)
+        behind = range(n - 1, max(n - self.prefetch//2, 0) - 1, -1)
+        for m in list(ahead) + list(behind):
+            # stop as soon as a new frame is requested
+            if self._pending():
+                return
+            if m not in self.cache and self._decode(m) is None:
+                return
+
+    def _decode(self, n):
+        frame = self.cache.get(n)
+        if frame is not None:
+            return frame
+
+        if not (self._pos <= n <= self._pos + self.keyframe_interval):
+            self._pos = n - n % self.keyframe_interval
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self._pos)
+        while self._pos <= n:
+            sucess, frame = self.cap.read()
+            if not sucess:
+                # past the end (the frame count of some containers is approximate)
+                self._pos = self.num_frames + self.keyframe_interval + 1
+                return None
+            self.cache.put(self._pos, frame)
+            self._pos += 1
+        return frame
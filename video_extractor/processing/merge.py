@@ -0,0 +1,127 @@
+import cv2
+import numpy as np
+import os
+import shutil
+import subprocess
+import tempfile
+
+from .process_video import VIDEO, TTL, TIME
+from .ttl_io import open_ttl_writer, load_ttl, ttl_extension
+from .ttl_events import extract_ttl_events
+
+
+def concat_files(fnames, fout):
+    # concatenate text outputs (csv, txt) in the given order
+    with open(fout, "wb") as fp_out:
+        for fname in fnames:
+            with open(fname, "rb") as fp:
+                shutil.copyfileobj(fp, fp_out)
+
+
+def merge_ttl(fnames, fout, ttl_format="csv"):
+    if ttl_format == "csv":
+        concat_files(fnames, fout)
+        return
+
+    writer = open_ttl_writer(fout, ttl_format)
+    try:
+        for fname in fnames:
+            rows = load_ttl(fname, ttl_format)
+            if len(rows) > 0:
+                writer.write(np.asarray(rows))
+    finally:
+        writer.close()
+
+
+def merge_outputs(transformer_set, part_prefixes, prefix, fps,
+                  skip_timestamp=False, skip_video=False, skip_ttl=False,
+                  ttl_format="csv", ttl_events=False):
+    """
+    Merge the outputs of consecutive partial exports (part_prefixes, in frame
+    order) into the output files of prefix. TTL events are extracted from the
+    merged TTL files, so pulses crossing part boundaries are kept whole.
+    """
+    if len(part_prefixes) == 0:
+        raise ValueError("There is no exported frame to be merged")
+
+    for n, trans in enumerate(transformer_set):
+        if trans is None:
+            continue
+        elif trans.type == VIDEO and not skip_video:
+            concat_videos([p + "(%d).avi"%(n) for p in part_prefixes], prefix + "(%d).avi"%(n))
+        elif trans.type == TTL and not skip_ttl:
+            fname = prefix + "_ttl(%d)"%(n) + ttl_extension(ttl_format)
+            merge_ttl([p + "_ttl(%d)"%(n) + ttl_extension(ttl_format) for p in part_prefixes], fname, ttl_format)
+            if ttl_events:
+                extract_ttl_events(fname, prefix + "_ttl_events(%d).csv"%(n), fps, ttl_format=ttl_format)
+        elif trans.type == TIME and not skip_timestamp:
+            concat_files([p + "_timestamp(%d).txt"%(n) for p in part_prefixes], prefix + "_timestamp(%d).txt"%(n))
+
+
+def check_video_merge(transformer_set, skip_video=False):
+    """
+    Video parts are joined losslessly by ffmpeg (stream copy). Raise before the
+    export if video ROIs are exported in parts and ffmpeg is not installed.
+    """
+    has_video = any(trans is not None and trans.type == VIDEO for trans in transformer_set)
+    if has_video and not skip_video and shutil.which("ffmpeg") is None:
+        raise FileNotFoundError("ffmpeg is not found, it is needed to merge the video parts of --workers/--checkpoint "
+                                "exports. Please install ffmpeg, or export the video ROIs without them")
+
+
+def concat_videos(fnames, fout):
+    if len(fnames) == 1:
+        shutil.copyfile(fnames[0], fout)
+        return
+
+    if shutil.which("ffmpeg") is not None:
+        if _concat_videos_ffmpeg(fnames, fout):
+            return
+    print("Warning: %s is merged by re-encoding the parts with OpenCV (lossy and slow)"%(os.path.basename(fout)))
+    _concat_videos_cv2(fnames, fout)
+
+
+def _concat_videos_ffmpeg(fnames, fout):
+    # stream copy, no re-encoding
+    fd, list_file = tempfile.mkstemp(suffix=".txt")
+    try:
+        with os.fdopen(fd, "w") as fp:
+            for fname in fnames:
+                path = os.path.abspath(fname).replace("'", "'\\''")
+                fp.write("file '%s'\n"%(path))
+
+        cmd = ["ffmpeg", "-y", "-loglevel", "error",
+               "-f", "concat", "-safe", "0", "-i", list_file,
+               "-c", "copy", fout]
+        res = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if res.returncode != 0:
+            print("ffmpeg concat failed: ", res.stderr.decode(errors="ignore"))
+            return False
+        return True
+    finally:
+        os.remove(list_file)
+
+
+def _concat_videos_cv2(fnames, fout):
+    # re-encode every segment with the codec of the first segment
+    cap = cv2.VideoCapture(fnames[0])
+    if not cap.isOpened():
+        raise FileExistsError(f"Cannot open video file: {fnames[0]}")
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    cap.release()
+
+    writer = cv2.VideoWriter(fout, fourcc, fps, size)
+    if not writer.isOpened():
+        raise ValueError("Cannot open the writable video file")
+
+    for fname in fnames:
+        cap = cv2.VideoCapture(fname)
+        while True:
+            sucess, frame = cap.read()
+            if not sucess:
+                break
+            writer.write(frame)
+        cap.release()
+    writer.release()
@@ -0,0 +1,337 @@
+import cv2
+import numpy as np
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+import pytesseract
+from datetime import datetime
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+
+OCR_WHITELIST = "0123456789:/.,msΔt"
+TESSERACT_CONFIG = r'--oem 3 --psm 6 -c tessedit_char_whitelist=' + OCR_WHITELIST
+OCR_BACKENDS = ("auto", "tesserocr", "pytesseract")
+OCR_CACHE_SIZE = 1024
+TIMESTAMP_FORMAT = "%y:%m:%d/%H:%M:%S.%f"
+
+# glyph template matching
+GLYPH_SIZE = 20
+GLYPH_NUM_CALIB = 20
+GLYPH_MAX_SAMPLES = 50
+GLYPH_MIN_SCORE = 0.85
+GLYPH_MIN_MARGIN = 0.05
+
+
+class PytesseractBackend:
+    """
+    Runs the tesseract executable through pytesseract (one process per image).
+    """
+    name = "pytesseract"
+
+    def image_to_string(self, image):
+        return pytesseract.image_to_string(image, config=TESSERACT_CONFIG)
+
+    def close(self):
+        pass
+
+
+class _EngineHolder:
+    def __init__(self, api):
+        self.api = api
+
+
+class TesserocrBackend:
+    """
+    Keeps a long-lived tesseract engine in the process (one handle per thread)
+    and reuses it for every frame. The first engine is initialized when the
+    backend is created, so a missing tessdata path fails here instead of on
+    every frame. An engine is ended when its thread exits (e.g. the workers
+    of a pipeline export) or when the backend is closed.
+    """
+    name = "tesserocr"
+
+    def __init__(self):
+        if tesserocr is None:
+            raise ImportError("tesserocr is not installed, please run: pip install tesserocr")
+        self._local = threading.local()
+        self._get_api()
+
+    def _get_api(self):
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            try:
+                api = tesserocr.PyTessBaseAPI(psm=tesserocr.PSM.SINGLE_BLOCK,
+                                              oem=tesserocr.OEM.DEFAULT)
+            except RuntimeError as e:
+                raise RuntimeError("tesserocr cannot initialize tesseract (set TESSDATA_PREFIX or use "
+                                   "--ocr_backend pytesseract): %s"%(e))
+            api.SetVariable("tessedit_char_whitelist", OCR_WHITELIST)
+            # the thread-local holder is released with its thread (or by close)
+            holder = _EngineHolder(api)
+            weakref.finalize(holder, api.End)
+            self._local.holder = holder
+        return holder.api
+
+    def image_to_string(self, image):
+        api = self._get_api()
+        h, w = image.shape[:2]
+        api.SetImageBytes(image.tobytes(), w, h, 1, w)
+        return api.GetUTF8Text()
+
+    def close(self):
+        # drops the engines of all threads, they are created again when needed
+        self._local = threading.local()
+
+
+_backends = dict()
+
+
+def get_ocr_backend(name="auto"):
+    # backends are created once per process and shared between exports
+    if name is None or name == "auto":
+        if "auto" not in _backends:
+            try:
+                _backends["auto"] = get_ocr_backend("tesserocr")
+            except (ImportError, RuntimeError) as e:
+                if tesserocr is not None:
+                    print("%s, using pytesseract"%(e))
+                _backends["auto"] = get_ocr_backend("pytesseract")
+        return _backends["auto"]
+
+    if name not in _backends:
+        if name == "tesserocr":
+            _backends[name] = TesserocrBackend()
+        elif name == "pytesseract":
+            _backends[name] = PytesseractBackend()
+        else:
+            raise ValueError("Unknown OCR backend: %s"%(name))
+    return _backends[name]
+
+
+def _runs(mask):
+    # [start, end) of the consecutive True runs in a 1D boolean array
+    d = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(d == 1), np.flatnonzero(d == -1)
+
+
+def segment_glyphs(image):
+    """
+    Split the first text line of a binarised image into character cells.
+    Returns (num_cells, GLYPH_SIZE**2) zero-mean, unit-norm vectors or None.
+    """
+    ink = image > 127
+    if ink.mean() > 0.5:
+        ink = ~ink
+
+    row_start, row_end = _runs(ink.any(axis=1))
+    if len(row_start) == 0:
+        return None
+    line = ink[row_start[0]:row_end[0]]
+    h = line.shape[0]
+
+    col_start, col_end = _runs(line.any(axis=0))
+    cells = np.zeros((len(col_start), GLYPH_SIZE*GLYPH_SIZE), dtype=np.float32)
+    for i, (a, b) in enumerate(zip(col_start, col_end)):
+        # pad to a square box so that the aspect ratio ('.', ':', '1') is kept
+        w = b - a
+        s = max(h, w)
+        canvas = np.zeros((s, s), dtype=np.float32)
+        y0, x0 = (s-h)//2, (s-w)//2
+        canvas[y0:y0+h, x0:x0+w] = line[:, a:b]
+        cells[i] = cv2.resize(canvas, (GLYPH_SIZE, GLYPH_SIZE), interpolation=cv2.INTER_AREA).ravel()
+
+    cells -= cells.mean(axis=1, keepdims=True)
+    norm = np.linalg.norm(cells, axis=1, keepdims=True)
+    cells /= np.maximum(norm, 1e-6)
+    return cells
+
+
+def _is_timestamp(text):
+    try:
+        datetime.strptime(text, TIMESTAMP_FORMAT)
+    except ValueError:
+        return False
+    return True
+
+
+class GlyphRecognizer:
+    """
+    Template matching recognizer for fixed-font timestamps. Character templates
+    are learned from frames that the fallback OCR parses well; frames that are
+    not matched with confidence, or whose text has a length never learned or
+    does not parse as TIMESTAMP_FORMAT, are passed to the fallback OCR.
+    """
+    def __init__(self, fallback, num_calib=GLYPH_NUM_CALIB,
+                 min_score=GLYPH_MIN_SCORE, min_margin=GLYPH_MIN_MARGIN):
+        self.fallback = fallback
+        self.num_calib = num_calib
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.num_learned = 0
+        self.num_matched = 0
+        self.num_fallback = 0
+        self._sums = dict()
+        self._counts = dict()
+        self._lengths = set()
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def calibrated(self):
+        return self._model is not None
+
+    def image_to_string(self, image):
+        cells = segment_glyphs(image)
+
+        if cells is not None and len(cells) > 0:
+            text = self._classify(cells)
+            if text is not None and len(text) in self._lengths and _is_timestamp(text):
+                with self._lock:
+                    self.num_matched += 1
+                return text
+
+        text = self.fallback.image_to_string(image)
+        with self._lock:
+            self.num_fallback += 1
+        if cells is not None:
+            self._learn(cells, text)
+        return text
+
+    def _classify(self, cells):
+        model = self._model
+        if model is None:
+            return None
+        chars, templates = model
+
+        scores = cells @ templates.T
+        if scores.shape[1] > 1:
+            top2 = np.partition(scores, -2, axis=1)[:, -2:]
+            margin = top2[:, 1] - top2[:, 0]
+        else:
+            margin = np.full(len(cells), np.inf)
+        best = scores.max(axis=1)
+        if best.min() < self.min_score or margin.min() < self.min_margin:
+            return None
+
+        return "".join(chars[scores.argmax(axis=1)])
+
+    def _learn(self, cells, text):
+        line = text.split("\n")[0]
+        if len(line) != len(cells) or not _is_timestamp(line):
+            return
+
+        with self._lock:
+            self._lengths.add(len(line))
+            for c, cell in zip(line, cells):
+                n = self._counts.get(c, 0)
+                if n >= GLYPH_MAX_SAMPLES:
+                    continue
+                self._sums[c] = self._sums.get(c, 0) + cell
+                self._counts[c] = n + 1
+            self.num_learned += 1
+
+            if self.num_learned >= self.num_calib:
+                chars = sorted(self._sums.keys())
+                templates = np.stack([self._sums[c] / self._counts[c] for c in chars])
+                templates -= templates.mean(axis=1, keepdims=True)
+                templates /= np.maximum(np.linalg.norm(templates, axis=1, keepdims=True), 1e-6)
+                self._model = (np.array(chars), templates)
+
+    def close(self):
+        self.fallback.close()
+
+    def report(self, desc="Glyph OCR"):
+        total = self.num_matched + self.num_fallback
+        rate = 100 * self.num_matched / total if total > 0 else 0
+        print("%s: %d matched, %d fallback OCR (%.1f%% matched)"%(desc, self.num_matched, self.num_fallback, rate))
+
+
+class OCRCache:
+    """
+    LRU cache of parsed timestamps keyed on a hash of the binarised crop.
+    """
+    def __init__(self, max_size=OCR_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(image):
+        digest = hashlib.blake2b(image.tobytes(), digest_size=16).digest()
+        return image.shape, digest
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def report(self, desc="OCR cache"):
+        total = self.hits + self.misses
+        rate = 100 * self.hits / total if total > 0 else 0
+        print("%s: %d hits, %d misses (hit rate %.1f%%)"%(desc, self.hits, self.misses, rate))
+
+
+def threshold_timestamp(frame):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
+    return thresh
+
+
+def read_timestamp(thresh, ocr=None, cache=None):
+    """
+    Read the datetime shown in a binarised timestamp crop (None if it cannot be parsed).
+    """
+    if ocr is None:
+        ocr = get_ocr_backend()
+
+    if cache is not None:
+        key = cache.make_key(thresh)
+        dt = cache.get(key)
+        if dt is not None:
+            return dt
+
+    try:
+        text = ocr.image_to_string(thresh)
+        text = text.split("\n")
+
+        timestamp = text[0]
+        dt = datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+    except Exception as e:
+        print("Error while parsing: ", e)
+        return None
+
+    if cache is not None:
+        cache.put(key, dt)
+
+    return dt
+
+
+def format_timestamp(dt):
+    if dt is None:
+        return "", ""
+    time_str = dt.strftime("%H:%M:%S.%f")
+    sec_str = "%.3f"%(dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1_000_000)
+    return time_str, sec_str
+
+
+def parse_timestamp(frame, ocr=None, cache=None):
+    return format_timestamp(read_timestamp(threshold_timestamp(frame), ocr=ocr, cache=cache))
@@ -0,0 +1,94 @@
+import cv2
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from tqdm import tqdm
+
+from .process_video import VideoReader, FPS
+from .merge import merge_outputs, check_video_merge
+
+
+NUM_PROCESSES = 4
+CHUNKS_PER_WORKER = 4
+
+
+def split_frames(frame_num, num_chunks):
+    # split [0, frame_num) into contiguous, non-empty ranges
+    num_chunks = max(1, min(num_chunks, frame_num))
+    bounds = [frame_num * i // num_chunks for i in range(num_chunks + 1)]
+    return [(bounds[i], bounds[i+1]) for i in range(num_chunks)]
+
+
+def _export_chunk(video, transformer_set, prefix, start_frame, end_frame, export_kwargs):
+    vobj = VideoReader(video)
+    vobj.transformer_set = transformer_set
+    try:
+        vobj.export_video(prefix, progbar=partial(tqdm, disable=True),
+                          start_frame=start_frame, end_frame=end_frame,
+                          **export_kwargs)
+    finally:
+        vobj.close()
+
+
+def export_video_chunked(video, transformer_set, prefix, workers=NUM_PROCESSES,
+                         num_chunks=None, progbar=tqdm,
+                         skip_timestamp=False, skip_video=False, skip_ttl=False,
+                         ttl_format="csv", ttl_events=False, **export_kwargs):
+    """
+    Export the video with a process pool. The frame range is split into chunks,
+    every chunk is exported into a temporary directory by its own VideoCapture
+    and the chunk outputs are merged back in frame order.
+    """
+    check_video_merge(transformer_set, skip_video=skip_video)
+    vobj = VideoReader(video)
+    vobj.transformer_set = transformer_set
+    frame_num = int(vobj.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = vobj.cap.get(cv2.CAP_PROP_FPS) or FPS
+    # the equalization mapping is resolved once (and saved) for all parts
+    vobj.set_histeq(export_kwargs.pop("histeq_interval", None), export_kwargs.pop("histeq_reference", None))
+    vobj.save_transform(prefix)
+    vobj.close()
+
+    if num_chunks is None:
+        num_chunks = workers * CHUNKS_PER_WORKER
+    chunks = split_frames(frame_num, num_chunks)
+    # the frame count is an estimate, the last chunk reads until the end of the video
+    chunks[-1] = (chunks[-1][0], None)
+
+    export_kwargs.update(skip_timestamp=skip_timestamp,
+                         skip_video=skip_video,
+                         skip_ttl=skip_ttl,
+                         ttl_format=ttl_format)
+
+    out_dir = os.path.dirname(os.path.abspath(prefix))
+    tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(prefix)+"_chunks_", dir=out_dir)
+    chunk_prefixes = [os.path.join(tmp_dir, "chunk%04d"%(i)) for i in range(len(chunks))]
+
+    try:
+        pbar = progbar(total=frame_num, desc="Exporting video (%d workers)"%(workers))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_export_chunk, video, transformer_set, chunk_prefix,
+                                   start_frame, end_frame, export_kwargs)
+                       for chunk_prefix, (start_frame, end_frame) in zip(chunk_prefixes, chunks)]
+            chunk_size = {future: (end_frame or frame_num) - start_frame
+                          for future, (start_frame, end_frame) in zip(futures, chunks)}
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    pbar.update(n=chunk_size[future])
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                pbar.close()
+
+        merge_outputs(transformer_set, chunk_prefixes, prefix, fps,
+                      skip_timestamp=skip_timestamp, skip_video=skip_video, skip_ttl=skip_ttl,
+                      ttl_format=ttl_format, ttl_events=ttl_events)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return True
@@ -0,0 +1,117 @@
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+QUEUE_SIZE = 32
+NUM_WORKERS = 4
+
+_STOP = object()
+
+
+def _put(q, item, stop_event):
+    # blocking put that gives up once the pipeline is stopped
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _decode(read_frame, frame_range, frame_queue, stop_event, errors):
+    try:
+        for n in frame_range:
+            if stop_event.is_set():
+                break
+            frame, msec = read_frame()
+            if frame is None:
+                break
+            if not _put(frame_queue, (n, frame, msec), stop_event):
+                break
+    except Exception as e:
+        errors.append(e)
+    finally:
+        _put(frame_queue, _STOP, stop_event)
+
+
+def _write(sink, sink_queue, stop_event, errors):
+    # keep draining even after a failure so the producer never blocks
+    while True:
+        item = sink_queue.get()
+        if item is _STOP:
+            break
+        n, msec, future = item
+        if stop_event.is_set():
+            future.cancel()
+            continue
+        try:
+            sink.write(n, future.result(), msec)
+        except Exception as e:
+            errors.append(e)
+            stop_event.set()
+
+
+def run_pipeline(read_frame, sinks, frame_range, pbar=None,
+                 num_workers=NUM_WORKERS, queue_size=QUEUE_SIZE, cancel_event=None):
+    """
+    Run export as decode -> transform -> write stages connected by bounded queues.
+
+    read_frame: callable returning the next (frame, msec) ((None, None) at the end of the video)
+    sinks: objects with process(frame) (thread-safe) and write(n, item, msec) (called in frame order)
+    frame_range: frame indices of the decoded frames
+    cancel_event: threading.Event, once set no more frames are decoded and the
+                  frames already in flight are written before returning
+    """
+    stop_event = threading.Event()
+    errors = []
+
+    frame_queue = queue.Queue(maxsize=queue_size)
+    sink_queues = [queue.Queue(maxsize=queue_size) for _ in sinks]
+
+    decoder = threading.Thread(target=_decode, daemon=True,
+                               args=(read_frame, frame_range, frame_queue, stop_event, errors))
+    writers = [threading.Thread(target=_write, daemon=True,
+                                args=(sink, q, stop_event, errors))
+               for sink, q in zip(sinks, sink_queues)]
+
+    decoder.start()
+    for w in writers:
+        w.start()
+
+    num_frames = 0
+    try:
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            while not stop_event.is_set():
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                try:
+                    item = frame_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _STOP:
+                    break
+                n, frame, msec = item
+                for sink, q in zip(sinks, sink_queues):
+                    q.put((n, msec, pool.submit(sink.process, frame)))
+                num_frames += 1
+                if pbar is not None:
+                    pbar.update(n=1)
+    except BaseException:
+        # the writers drop the frames in flight
+        stop_event.set()
+        raise
+    finally:
+        # the writers are done before the caller closes the sinks
+        for q in sink_queues:
+            q.put(_STOP)
+        for w in writers:
+            w.join()
+        stop_event.set()
+        decoder.join()
+
+    if errors:
+        raise errors[0]
+
+    return num_frames
@@ -0,0 +1,170 @@
+import threading
+import time
+import dataclasses
+from collections import deque
+import cv2
+import numpy as np
+
+from .process_video import ROI_NAMES, FPS
+
+
+# every ROI is shown in a box of this size (width, height)
+TILE_SIZE = (320, 240)
+TILE_GAP = 4
+# time spent at most on skipping late frames before the next one is shown
+MAX_SKIP_SEC = 0.2
+
+
+def preview_transform(trans, tile_size=TILE_SIZE):
+    """
+    Copy of the ROI (geometry and colour adjustment) with an output that fits
+    into tile_size, so the warp itself runs at preview resolution.
+    """
+    s = min(tile_size[0] / trans.max_width, tile_size[1] / trans.max_height, 1)
+    if s == 1:
+        # a copy all the same: the caches of the exported ROI are not shared
+        return dataclasses.replace(trans)
+    S = np.diag([s, s, 1])
+    return dataclasses.replace(trans, M=S @ trans.M,
+                               max_width=max(int(trans.max_width * s), 1),
+                               max_height=max(int(trans.max_height * s), 1))
+
+
+def roi_mosaic(frame, transforms, labels, tile_size=TILE_SIZE):
+    # transformed ROIs side by side, each fitted into a tile_size box
+    tw, th = tile_size
+    mosaic = np.zeros((th, len(transforms) * (tw + TILE_GAP) - TILE_GAP, 3), dtype=np.uint8)
+    for i, (trans, label) in enumerate(zip(transforms, labels)):
+        roi = trans.transform(frame)
+        h, w = roi.shape[:2]
+        s = min(tw / w, th / h)
+        if s != 1:
+            # small ROIs (TTL LED) are enlarged without smoothing
+            roi = cv2.resize(roi, (max(int(w * s), 1), max(int(h * s), 1)),
+                             interpolation=cv2.INTER_NEAREST if s > 1 else cv2.INTER_AREA)
+            h, w = roi.shape[:2]
+        x0 = i * (tw + TILE_GAP) + (tw - w)//2
+        y0 = (th - h)//2
+        mosaic[y0:y0+h, x0:x0+w] = roi
+        cv2.putText(mosaic, label, (i * (tw + TILE_GAP) + 4, 16), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.45, (0, 255, 255), 1, cv2.LINE_AA)
+    return mosaic
+
+
+class PreviewPlayer:
+    """
+    Plays a video with all ROIs of transformer_set on a background thread.
+
+    Frames are paced to the source frame rate (times speed). When decoding and
+    transforming cannot keep up, late frames are skipped with grab() (decoded
+    but not converted or transformed). If even decoding is too slow, skipping
+    stops after MAX_SKIP_SEC and the playback continues slower than real
+    time, so mosaics are still shown regularly. Only the newest mosaic is kept: notify() is called from
+    the player thread when a mosaic is ready (or playback ended) and take()
+    returns it, so a slow display drops frames as well.
+    """
+    def __init__(self, file_path, transformer_set, notify=None, start_frame=0,
+                 speed=1.0, tile_size=TILE_SIZE):
+        self.file_path = file_path
+        self.notify = notify
+        self.tile_size = tile_size
+        self.transforms = []
+        self.labels = []
+        for n, trans in enumerate(transformer_set):
+            if trans is None:
+                continue
+            self.transforms.append(preview_transform(trans, tile_size))
+            self.labels.append("%s(%d)"%(ROI_NAMES.get(trans.type, "roi"), n))
+        if len(self.transforms) == 0:
+            raise ValueError("There is no ROI to be previewed")
+
+        cap = cv2.VideoCapture(file_path)
+        if not cap.isOpened():
+            raise FileExistsError(f"Cannot open video file: {file_path}")
+        self.source_fps = cap.get(cv2.CAP_PROP_FPS) or FPS
+        cap.release()
+        self.target_fps = self.source_fps * speed
+
+        self.frame_index = start_frame
+        self.dropped = 0
+        self.finished = False
+        self._latest = None
+        self._shown = deque()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self.finished = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # playback can be started again from the last frame
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def is_playing(self):
+        return self._thread is not None and not self.finished
+
+    def take(self):
+        # newest (frame index, mosaic) or None, counted as displayed
+        with self._lock:
+            item, self._latest = self._latest, None
+            if item is not None:
+                now = time.perf_counter()
+                self._shown.append(now)
+                while self._shown and now - self._shown[0] >= 1:
+                    self._shown.popleft()
+        return item
+
+    @property
+    def fps(self):
+        # displayed frames in the last second
+        with self._lock:
+            return len(self._shown)
+
+    def _post(self, item):
+        with self._lock:
+            was_empty = self._latest is None
+            self._latest = item
+        if was_empty and self.notify is not None:
+            self.notify()
+
+    def _run(self):
+        cap = cv2.VideoCapture(self.file_path)
+        try:
+            n = self.frame_index
+            cap.set(cv2.CAP_PROP_POS_FRAMES, n)
+            # frame n0 is due at t0
+            n0, t0 = n, time.perf_counter()
+            while not self._stop_event.is_set():
+                # skip the frames that are already late
+                due = n0 + int((time.perf_counter() - t0) * self.target_fps)
+                skip_end = time.perf_counter() + MAX_SKIP_SEC
+                while n < due and time.perf_counter() < skip_end and cap.grab():
+                    n += 1
+                    self.dropped += 1
+                if n < due:
+                    # decoding alone is too slow: continue slower than real time
+                    n0, t0 = n, time.perf_counter()
+
+                sucess, frame = cap.read()
+                if not sucess:
+                    self.finished = True
+                    break
+                self._post((n, roi_mosaic(frame, self.transforms, self.labels, self.tile_size)))
+                n += 1
+                self.frame_index = n
+
+                # wait until the next frame is due
+                delay = t0 + (n - n0) / self.target_fps - time.perf_counter()
+                if delay > 0:
+                    self._stop_event.wait(delay)
+        finally:
+            cap.release()
+        if self.finished and self.notify is not None:
+            self.notify()
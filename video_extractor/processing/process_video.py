@@ -1,19 +1,59 @@
 import cv2
 import numpy as np
 from tqdm import tqdm
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import pickle as pkl
 from typing import List
 import csv
-import pytesseract
-from datetime import datetime
+import os
+import itertools
+import threading
+from collections import deque
 
-from ..gui.control_panel import VIDEO, TTL, TIME
+from .pipeline import run_pipeline, NUM_WORKERS, QUEUE_SIZE
+from .ttl_io import open_ttl_writer, ttl_extension, TTL_COLUMNS, TTL_CHUNK_SIZE
+from .ttl_events import TTLEventExtractor
+from .writers import open_video_writer, FFMPEG_CODEC, FFMPEG_CRF, FFMPEG_PRESET
+from .ocr import (
+    parse_timestamp, threshold_timestamp, read_timestamp, format_timestamp,
+    get_ocr_backend, OCRCache, GlyphRecognizer, OCR_CACHE_SIZE
+)
 
 
+# ROI (output) types
+VIDEO = 0
+TTL = 1
+TIME = 2
+ROI_NAMES = {VIDEO: "video", TTL: "ttl", TIME: "timestamp"}
+
+# colour order of the frames passed to TransformInfo (decoded frames are BGR)
+COLOR_BGR = "BGR"
+COLOR_RGB = "RGB"
+_YCRCB = {
+    COLOR_BGR: (cv2.COLOR_BGR2YCrCb, cv2.COLOR_YCrCb2BGR),
+    COLOR_RGB: (cv2.COLOR_RGB2YCrCb, cv2.COLOR_YCrCb2RGB),
+}
+
 FPS = 25
 EXT = ".avi"
 VIDEO_OUTPUT_HEIGHT = 1000
+ANCHOR_INTERVAL = 25
+BBOX_MARGIN = 2
+
+# warp classes of TransformInfo.M
+WARP_CROP = 0           # integer translation: slicing
+WARP_SCALE = 1          # scale + translation: slicing + resize
+WARP_AFFINE = 2         # warpAffine
+WARP_PERSPECTIVE = 3    # full homography: remap with cached maps
+# below this output size (pixels) warpPerspective is as fast as remap and needs no maps
+REMAP_MIN_PIXELS = 32*32
+# ROI corners closer than this to an integer pixel are snapped to it
+CORNER_SNAP = 1e-2
+
+_TRANSFORM_GEOMETRY = ("M", "max_width", "max_height")
+_TRANSFORM_CACHE = ("_ttl_weights", "_kind", "_warp", "_histeq_state")
+# guards the shared equalization mapping when ROI workers run in parallel
+_HISTEQ_LOCK = threading.Lock()
 
 @dataclass
 class TransformInfo:
@@ -25,42 +65,462 @@ class TransformInfo:
     contrast: float = 1
     histeq: bool = False
     type: int = -1
+    # equalization mapping (256 LUT) of a reference frame, see set_histeq_reference
+    histeq_lut: np.ndarray = field(default=None, repr=False, compare=False)
+    # 0: equalize every frame with its own histogram (or histeq_lut if set),
+    # N > 0: the mapping is computed from one frame and reused for N frames
+    # (in --pipeline mode the refresh frame can differ by a few frames)
+    histeq_interval: int = 0
+    # cached, derived from the geometry (not pickled)
+    _ttl_weights: tuple = field(default=None, init=False, repr=False, compare=False)
+    _kind: int = field(default=None, init=False, repr=False, compare=False)
+    _warp: tuple = field(default=None, init=False, repr=False, compare=False)
+    _histeq_state: tuple = field(default=None, init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        self._kind = classify_homography(self.M)
+    
+    def __setattr__(self, key, value):
+        # a new geometry invalidates the cached maps
+        if key in _TRANSFORM_GEOMETRY:
+            for cache_key in _TRANSFORM_CACHE:
+                object.__setattr__(self, cache_key, None)
+        object.__setattr__(self, key, value)
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in _TRANSFORM_CACHE:
+            state.pop(key, None)
+        return state
     
-    def transform(self, frame):
-        frame = cv2.warpPerspective(frame, self.M, (self.max_width, self.max_height))
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for key in _TRANSFORM_CACHE:
+            self.__dict__.setdefault(key, None)
+    
+    def transform(self, frame, color_order=COLOR_BGR):
+        return self.adjust(self.warp(frame), color_order)
+    
+    def adjust(self, frame, color_order=COLOR_BGR):
+        # brightness/contrast and histogram equalization of a warped frame
+        frame = self._scale(frame)
+        if self.histeq:
+            to_ycrcb, from_ycrcb = _YCRCB[color_order]
+            ycrcb = cv2.cvtColor(frame, to_ycrcb)
+            luma = ycrcb[:,:,0]
+            lut = self._histeq_mapping(luma)
+            ycrcb[:,:,0] = cv2.equalizeHist(luma) if lut is None else cv2.LUT(luma, lut)
+            frame = cv2.cvtColor(ycrcb, from_ycrcb)
+        return frame
+    
+    def _scale(self, frame):
+        # convertScaleAbs is faster than cv2.LUT with the equivalent 256 table
         if self.contrast != 1 or self.brightness != 0:
             frame = cv2.convertScaleAbs(frame, alpha=self.contrast, beta=self.brightness)
-        if self.histeq:
-            ycrcb = cv2.cvtColor(frame, cv2.COLOR_RGB2YCrCb)
-            ycrcb[:,:,0] = cv2.equalizeHist(ycrcb[:,:,0])
-            frame = cv2.cvtColor(ycrcb, cv2.COLOR_YCrCb2RGB)
         return frame
     
+    def _histeq_mapping(self, luma):
+        # None: equalize the frame with its own histogram
+        if self.histeq_interval <= 0:
+            return self.histeq_lut
+        with _HISTEQ_LOCK:
+            count, lut = self._histeq_state or (0, self.histeq_lut)
+            if lut is None or count >= self.histeq_interval:
+                count, lut = 0, equalize_lut(luma)
+            self._histeq_state = (count + 1, lut)
+        return lut
+    
+    def set_histeq_reference(self, frame, color_order=COLOR_BGR):
+        """
+        Equalize every frame with the mapping of the given (source) frame instead
+        of its own histogram, the brightness of the output stays stable over time.
+        """
+        to_ycrcb, _ = _YCRCB[color_order]
+        luma = cv2.cvtColor(self._scale(self.warp(frame)), to_ycrcb)[:,:,0]
+        self.histeq_lut = equalize_lut(luma)
+        self._histeq_state = None
+    
+    @property
+    def warp_kind(self):
+        if self._kind is None:
+            self._kind = classify_homography(self.M)
+        return self._kind
+    
+    def warp(self, frame):
+        # warp parameters depend on the frame size (bounding box clipped to the frame)
+        if self._warp is None or self._warp[0] != frame.shape[:2]:
+            self._warp = (frame.shape[:2],) + self._build_warp(frame.shape[:2])
+        _, kind, (x0, y0, x1, y1), params = self._warp
+        
+        # only the source bounding box of the ROI is read
+        roi = frame[y0:y1, x0:x1]
+        size = (self.max_width, self.max_height)
+        if kind == WARP_CROP:
+            return roi
+        elif kind == WARP_SCALE:
+            return cv2.resize(roi, size, interpolation=cv2.INTER_LINEAR)
+        elif kind == WARP_AFFINE:
+            return cv2.warpAffine(roi, params, size, flags=cv2.INTER_LINEAR,
+                                  borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        elif not isinstance(params, tuple):
+            # small output: params is the homography of the bounding box
+            return cv2.warpPerspective(roi, params, size, flags=cv2.INTER_LINEAR,
+                                       borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        else:
+            map1, map2 = params
+            return cv2.remap(roi, map1, map2, cv2.INTER_LINEAR,
+                             borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+    
+    def _build_warp(self, shape):
+        kind = self.warp_kind
+        H = self.M / self.M[2, 2]
+        h, w = shape
+        
+        if kind == WARP_CROP:
+            x0, y0 = -int(round(H[0, 2])), -int(round(H[1, 2]))
+            bbox = (x0, y0, x0 + self.max_width, y0 + self.max_height)
+            if _is_inside(bbox, shape):
+                return kind, bbox, None
+            
+        elif kind == WARP_SCALE:
+            # cv2.resize samples the source at (x + 0.5) * n / w - 0.5 + x0, which is the same
+            # sampling as M only if the source slice [x0, x0 + n) has integer bounds
+            bounds = []
+            for sc, t, size in ((H[0, 0], H[0, 2], self.max_width), (H[1, 1], H[1, 2], self.max_height)):
+                n = size / sc
+                x0 = -t / sc - 0.5 / sc + 0.5
+                bounds.append((x0, n))
+            if all(_is_integer(v) for b in bounds for v in b):
+                (x0, nx), (y0, ny) = [(int(round(x0)), int(round(n))) for x0, n in bounds]
+                bbox = (x0, y0, x0 + nx, y0 + ny)
+                if _is_inside(bbox, shape):
+                    return kind, bbox, None
+        
+        # general warp of the bounding box: move the origin of M to its corner
+        bbox = self._source_bbox(shape)
+        x0, y0 = bbox[:2]
+        M = H @ np.array([[1, 0, x0], [0, 1, y0], [0, 0, 1]], dtype=np.float64)
+        
+        if kind != WARP_PERSPECTIVE:
+            return WARP_AFFINE, bbox, M[:2]
+        if self.max_width * self.max_height <= REMAP_MIN_PIXELS:
+            return kind, bbox, M
+        
+        # same sampling as warpPerspective, stored as fixed-point maps
+        sx, sy = self._source_coords(M)
+        map_x = sx.reshape(self.max_height, self.max_width).astype(np.float32)
+        map_y = sy.reshape(self.max_height, self.max_width).astype(np.float32)
+        return kind, bbox, cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+    
+    def _source_bbox(self, shape, margin=BBOX_MARGIN):
+        # bounding box of the ROI corners in the source frame, clipped to the frame
+        h, w = shape
+        corners = np.array([[0, self.max_width-1, self.max_width-1, 0],
+                            [0, 0, self.max_height-1, self.max_height-1],
+                            [1, 1, 1, 1]], dtype=np.float64)
+        src = np.linalg.inv(self.M) @ corners
+        sx, sy = src[0] / src[2], src[1] / src[2]
+        
+        x0 = int(np.clip(np.floor(sx.min()) - margin, 0, w - 1))
+        y0 = int(np.clip(np.floor(sy.min()) - margin, 0, h - 1))
+        x1 = int(np.clip(np.ceil(sx.max()) + margin + 1, x0 + 1, w))
+        y1 = int(np.clip(np.ceil(sy.max()) + margin + 1, y0 + 1, h))
+        return x0, y0, x1, y1
+    
+    def _source_coords(self, M=None):
+        # source position of every output pixel (row-major)
+        if M is None:
+            M = self.M
+        ys, xs = np.mgrid[0:self.max_height, 0:self.max_width]
+        dst = np.stack([xs.ravel(), ys.ravel(), np.ones(xs.size)]).astype(np.float64)
+        src = np.linalg.inv(M) @ dst
+        return src[0] / src[2], src[1] / src[2]
+    
+    def mean_color(self, frame):
+        """
+        Per-channel mean of transform(frame), computed without warping.
+        """
+        if self.contrast != 1 or self.brightness != 0 or self.histeq:
+            # non-linear adjustment, the mean has to be taken after the warp
+            return self.transform(frame).mean(axis=0).mean(axis=0)
+        
+        if self._ttl_weights is None or self._ttl_weights[0] != frame.shape[:2]:
+            self._ttl_weights = (frame.shape[:2],) + self._source_weights(frame.shape[:2])
+        _, (x0, y0, x1, y1), weights = self._ttl_weights
+        
+        roi = frame[y0:y1, x0:x1]
+        return weights @ roi.reshape(weights.shape[0], -1)
+    
+    def _source_weights(self, shape):
+        # bilinear sampling weights of every output pixel, accumulated in source coordinates
+        h, w = shape
+        sx, sy = self._source_coords()
+        
+        ix, iy = np.floor(sx).astype(np.int64), np.floor(sy).astype(np.int64)
+        fx, fy = sx - ix, sy - iy
+        
+        # source bounding box, clipped to the frame
+        x0, y0 = max(ix.min(), 0), max(iy.min(), 0)
+        x1, y1 = min(ix.max() + 2, w), min(iy.max() + 2, h)
+        x1, y1 = max(x1, x0 + 1), max(y1, y0 + 1)
+        bw, bh = x1 - x0, y1 - y0
+        
+        weights = np.zeros(bw * bh)
+        for dx, dy, wt in ((0, 0, (1-fx)*(1-fy)), (1, 0, fx*(1-fy)),
+                           (0, 1, (1-fx)*fy), (1, 1, fx*fy)):
+            px, py = ix + dx, iy + dy
+            # samples outside of the frame are zero (constant border)
+            valid = (px >= x0) & (px < x1) & (py >= y0) & (py < y1)
+            idx = (py[valid] - y0) * bw + (px[valid] - x0)
+            weights += np.bincount(idx, weights=wt[valid], minlength=bw * bh)
+        
+        weights /= self.max_width * self.max_height
+        return (x0, y0, x1, y1), weights
+    
     # def set_default_wh(self):
     #     self.max_width = VIDEO_OUTPUT_HEIGHT
     #     self.max_height = VIDEO_OUTPUT_HEIGHT
     
-def parse_timestamp(frame):
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
+def _is_integer(value, eps=1e-6):
+    return abs(value - round(value)) < eps
+
+
+def _is_inside(bbox, shape):
+    x0, y0, x1, y1 = bbox
+    return x0 >= 0 and y0 >= 0 and x1 <= shape[1] and y1 <= shape[0]
+
+
+def equalize_lut(luma):
+    """
+    Mapping of cv2.equalizeHist for the histogram of luma as a 256 LUT, values
+    below the darkest pixel map to 0 (identity for a flat image).
+    """
+    hist = cv2.calcHist([np.ascontiguousarray(luma)], [0], None, [256], [0, 256]).ravel()
+    lo = np.flatnonzero(hist)[0]
+    if hist[lo] == hist.sum():
+        return np.arange(256, dtype=np.uint8)
+    # same float32 arithmetic and rounding as cv2.equalizeHist
+    scale = np.float32(255) / np.float32(hist.sum() - hist[lo])
+    cdf = (np.cumsum(hist[lo:], dtype=np.float64) - hist[lo]).astype(np.float32)
+    lut = np.zeros(256, dtype=np.uint8)
+    lut[lo:] = np.clip(np.rint(cdf * scale), 0, 255)
+    return lut
+
+
+def classify_homography(M, eps=1e-9):
+    H = M / M[2, 2]
+    if abs(H[2, 0]) > eps or abs(H[2, 1]) > eps:
+        return WARP_PERSPECTIVE
+    if abs(H[0, 1]) > eps or abs(H[1, 0]) > eps:
+        return WARP_AFFINE
+    if abs(H[0, 0] - 1) < eps and abs(H[1, 1] - 1) < eps and _is_integer(H[0, 2]) and _is_integer(H[1, 2]):
+        return WARP_CROP
+    return WARP_SCALE
+
+
+def save_datestr(date_set, fname):
+    with open(fname, "w") as fp:
+        # (time_str, sec_str) or (time_str, sec_str, is_read)
+        for row in date_set:
+            fp.write(",".join(str(v) for v in row) + "\n")
+
+
+def save_ttl(ttl, fname):
+    with open(fname, "w", newline='') as fp:
+        csv_writer = csv.writer(fp)
+        for n in range(len(ttl)):
+            csv_writer.writerow(ttl[n])
+
+
+# Export sinks: process() is called from ROI workers (must be thread-safe),
+# write() is called once per frame in frame order, close() finalizes the output
+class VideoSink:
+    # stage names of the profiler (time of process besides the transform, write)
+    PROCESS_STAGE = None
+    WRITE_STAGE = "encode"
     
-    try:
-        custom_config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789:/.,msΔt'
-        text = pytesseract.image_to_string(thresh, config=custom_config)
-        text = text.split("\n")
+    def __init__(self, trans, fname, fps=FPS, writer="opencv", **writer_kwargs):
+        self.trans = trans
+        self.writer = open_video_writer(fname, (trans.max_width, trans.max_height), fps,
+                                        writer=writer, **writer_kwargs)
         
-        timestamp = text[0]
-        dt = datetime.strptime(timestamp, "%y:%m:%d/%H:%M:%S.%f")
+    def process(self, frame):
+        # a crop is a view of the source frame: copy it, the writers need contiguous
+        # frames and queued ROIs should not keep whole frames alive
+        return np.ascontiguousarray(self.trans.transform(frame))
+    
+    def write(self, n, warp, msec=None):
+        self.writer.write(warp)
         
-        time_str = dt.strftime("%H:%M:%S.%f")
-        sec_str = "%.3f"%(dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1_000_000)
-    except Exception as e:
-        print("Error while parsing: ", e)
+    def close(self):
+        self.writer.close()
+
+
+class TTLSink:
+    """
+    Collects TTL rows in a fixed-size buffer and appends them to the output
+    file whenever the buffer is full, so memory does not grow with the video.
+    Every flushed block is also passed to the event extractor (if given).
+    """
+    PROCESS_STAGE = "mean"
+    WRITE_STAGE = "write"
+    
+    def __init__(self, trans, fname, ttl_format="csv", chunk_size=TTL_CHUNK_SIZE, events=None):
+        self.trans = trans
+        self.fname = fname
+        self.writer = open_ttl_writer(fname, ttl_format)
+        self.events = events
+        self.buffer = np.empty((chunk_size, len(TTL_COLUMNS)))
+        self.num_buffer = 0
+        
+    def process(self, frame):
+        return self.trans.mean_color(frame)
+    
+    def write(self, n, value, msec=None):
+        row = self.buffer[self.num_buffer]
+        row[0] = n
+        row[1] = np.nan if msec is None else msec
+        row[2:] = value
+        self.num_buffer += 1
+        if self.num_buffer == len(self.buffer):
+            self.flush()
+            
+    def flush(self):
+        if self.num_buffer > 0:
+            self.writer.write(self.buffer[:self.num_buffer])
+            if self.events is not None:
+                self.events.update(self.buffer[:self.num_buffer])
+            self.num_buffer = 0
+        
+    def close(self):
+        self.flush()
+        self.writer.close()
+        if self.events is not None:
+            self.events.close()
+
+
+class TimestampSink:
+    PROCESS_STAGE = "ocr"
+    WRITE_STAGE = "write"
+    
+    def __init__(self, trans, fname, ocr=None, cache_size=OCR_CACHE_SIZE):
+        self.trans = trans
+        self.fname = fname
+        self.ocr = ocr
+        self.cache = OCRCache(cache_size) if cache_size > 0 else None
+        self.data = []
+        
+    def process(self, frame):
+        return parse_timestamp(self.trans.transform(frame), ocr=self.ocr, cache=self.cache)
+    
+    def write(self, n, value, msec=None):
+        self.data.append(value)
+        
+    def close(self):
+        save_datestr(self.data, self.fname)
+        if self.cache is not None:
+            self.cache.report("OCR cache (%s)"%(os.path.basename(self.fname)))
+        if isinstance(self.ocr, GlyphRecognizer):
+            self.ocr.report("Glyph OCR (%s)"%(os.path.basename(self.fname)))
+        if self.ocr is not None:
+            # OCR engines are not kept between exports
+            self.ocr.close()
+
+
+class PredictedTimestampSink(TimestampSink):
+    """
+    Reads only anchor frames (every anchor_interval frames) and interpolates the
+    timestamps in between. A segment is accepted when the elapsed time between its
+    anchors matches the frame cadence (within tolerance * cadence); otherwise its
+    middle frame is read and both halves are checked again. Every row is flagged
+    as read (1) or inferred (0).
+    """
+    # OCR runs in write (frames are read in order)
+    PROCESS_STAGE = "threshold"
+    WRITE_STAGE = "ocr"
+    
+    def __init__(self, trans, fname, ocr=None, cache_size=OCR_CACHE_SIZE,
+                 anchor_interval=ANCHOR_INTERVAL, tolerance=0.5):
+        super().__init__(trans, fname, ocr=ocr, cache_size=cache_size)
+        self.anchor_interval = anchor_interval
+        self.tolerance = tolerance
+        self.cadence = None
+        self.num_read = 0
+        self.num_inferred = 0
+        self._cadence_samples = deque(maxlen=16)
+        # crops and values from the last anchor to the current frame
+        self._crops = []
+        self._values = []
+        self._is_read = []
         
-        time_str = ""
-        sec_str = ""
+    def process(self, frame):
+        return threshold_timestamp(self.trans.transform(frame))
     
-    return time_str, sec_str
+    def write(self, n, thresh, msec=None):
+        self._crops.append(thresh)
+        self._values.append(None)
+        self._is_read.append(False)
+        
+        if len(self._crops) == 1:
+            # first frame is the first anchor
+            self._read(0)
+        elif len(self._crops) > self.anchor_interval:
+            self._resolve_segment()
+            self._flush()
+            
+    def close(self):
+        if len(self._crops) > 1:
+            self._resolve_segment()
+        self._flush(final=True)
+        super().close()
+        print("Timestamp prediction (%s): %d read, %d inferred"
+              %(os.path.basename(self.fname), self.num_read, self.num_inferred))
+        
+    def _read(self, i):
+        self._values[i] = read_timestamp(self._crops[i], ocr=self.ocr, cache=self.cache)
+        self._is_read[i] = True
+        self.num_read += 1
+        
+    def _resolve_segment(self):
+        last = len(self._crops) - 1
+        self._read(last)
+        self._resolve(0, last)
+        
+    def _resolve(self, i, j):
+        if j - i <= 1:
+            self._add_cadence(i, j)
+            return
+        
+        vi, vj = self._values[i], self._values[j]
+        if vi is not None and vj is not None and self.cadence is not None:
+            error = abs((vj - vi) - self.cadence * (j - i))
+            if error <= self.cadence * self.tolerance:
+                for k in range(i+1, j):
+                    self._values[k] = vi + (vj - vi) * (k - i) / (j - i)
+                    self.num_inferred += 1
+                self._add_cadence(i, j)
+                return
+        
+        m = (i + j) // 2
+        self._read(m)
+        self._resolve(i, m)
+        self._resolve(m, j)
+        
+    def _add_cadence(self, i, j):
+        vi, vj = self._values[i], self._values[j]
+        if vi is None or vj is None or vj < vi:
+            return
+        self._cadence_samples.append((vj - vi) / (j - i))
+        self.cadence = sorted(self._cadence_samples)[len(self._cadence_samples)//2]
+        
+    def _flush(self, final=False):
+        # keep the last anchor, it starts the next segment
+        end = len(self._crops) if final else len(self._crops) - 1
+        for k in range(end):
+            self.data.append(format_timestamp(self._values[k]) + (int(self._is_read[k]),))
+        self._crops = self._crops[end:]
+        self._values = self._values[end:]
+        self._is_read = self._is_read[end:]
 
 
 class VideoReader:
@@ -82,21 +542,38 @@ class VideoReader:
             raise FileExistsError(f"Cannot open video file: {self.file_path}")
         
     def read_frame(self):
+        self.frame = self.read_raw_frame()
+        return self.frame
+    
+    def read_raw_frame(self):
+        """
+        Next decoded frame as returned by the decoder (BGR, not converted or copied).
+        """
         if self.cap is None:
             return None
         
         sucess, frame = self.cap.read()
         if not sucess:
             return None
-        
-        self.frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        return self.frame
+        return frame
+    
+    def _read_timed_frame(self):
+        # frame and its source timestamp (ms)
+        frame = self.read_raw_frame()
+        if frame is None:
+            return None, None
+        return frame, self.cap.get(cv2.CAP_PROP_POS_MSEC)
     
     def close(self):
         if self.cap is not None:
-            self.cap.close()
+            self.cap.release()
             
     def get_transmat(self, rect, max_width=0, max_height=0):
+        # corners on (nearly) integer pixels keep rectangles on the crop/resize paths
+        rect = np.asarray(rect, dtype="float32")
+        snapped = np.round(rect)
+        rect = np.where(np.abs(rect - snapped) < CORNER_SNAP, snapped, rect).astype("float32")
+        
         # Destination rectangle
         dst = np.array([
             [0, 0],
@@ -138,24 +615,23 @@ class VideoReader:
         
         return self.warped
     
-    def adjust_image(self, frame, value_bright, value_contrast, is_histnorm: bool):
-        frame_adjust = frame.copy()
-        if value_contrast != 1 or value_bright != 0:
-            frame_adjust = cv2.convertScaleAbs(frame_adjust, alpha=value_contrast, beta=value_bright)
-        if is_histnorm:
-            ycrcb = cv2.cvtColor(frame_adjust, cv2.COLOR_RGB2YCrCb)
-            ycrcb[:,:,0] = cv2.equalizeHist(ycrcb[:,:,0])
-            frame_adjust = cv2.cvtColor(ycrcb, cv2.COLOR_YCrCb2RGB)
-        
+    def adjust_image(self, frame, value_bright, value_contrast, is_histnorm: bool,
+                     color_order=COLOR_BGR):
         self.transformer.brightness = value_bright
         self.transformer.contrast   = value_contrast
         self.transformer.histeq     = is_histnorm
             
-        return frame_adjust
+        return self.transformer.adjust(frame, color_order)
     
     # def set_transtype(self, type):
     #     self.transformer.type =  type
     
+    def set_frame(self, frame):
+        # frame selected on the GUI timeline, ROIs are chosen on it
+        self.frame = frame
+        self.warped = None
+        self.last_frame = frame
+
     def get_original_frame(self):
         self.warped = None
         self.last_frame = self.frame
@@ -192,101 +668,153 @@ class VideoReader:
     #     with open(file_path, "wb") as f:
     #         pkl.dump(self.transformer_set, f)
     
+    def set_histeq(self, interval=None, reference_frame=None):
+        """
+        Equalization mapping of the ROIs with histeq: reused for interval frames
+        and/or taken from the frame number reference_frame (see TransformInfo).
+        """
+        reference = None
+        if reference_frame is not None:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, reference_frame)
+            reference = self.read_raw_frame()
+            if reference is None:
+                raise ValueError("Cannot read the reference frame %d"%(reference_frame))
+        
+        for trans in self.transformer_set:
+            if trans is None or not trans.histeq:
+                continue
+            if interval is not None:
+                trans.histeq_interval = interval
+            if reference is not None:
+                trans.set_histeq_reference(reference)
+    
     def export_video(self, prefix, progbar=tqdm,
-                     skip_timestamp=False, skip_video=False, skip_ttl=False):
+                     skip_timestamp=False, skip_video=False, skip_ttl=False,
+                     pipeline=False, num_workers=NUM_WORKERS, queue_size=QUEUE_SIZE,
+                     start_frame=0, end_frame=None, ocr_backend="auto",
+                     ocr_cache_size=OCR_CACHE_SIZE, glyph_ocr=False,
+                     predict_timestamp=False, anchor_interval=ANCHOR_INTERVAL,
+                     ttl_format="csv", ttl_events=False, video_writer="opencv",
+                     video_fps=None, video_codec=FFMPEG_CODEC, video_crf=FFMPEG_CRF,
+                     video_preset=FFMPEG_PRESET, histeq_interval=None, histeq_reference=None,
+                     profiler=None, cancel_event=None):
+        """
+        Returns False if the export was stopped with cancel_event (threading.Event),
+        the outputs are then closed with the frames exported so far.
+        """
+        # CAP_PROP_FRAME_COUNT is only an estimate (VFR, damaged files): without
+        # end_frame, frames are read until the decoder stops
+        if end_frame is None:
+            frame_num = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)) - start_frame
+            frame_range = itertools.count(start_frame)
+        else:
+            frame_num = end_frame - start_frame
+            frame_range = range(start_frame, end_frame)
+            if frame_num <= 0:
+                raise ValueError("Invalid frame range: %d - %d"%(start_frame, end_frame))
         
-        frame_num = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if histeq_interval is not None or histeq_reference is not None:
+            self.set_histeq(histeq_interval, histeq_reference)
         
         # save transformation information
         self.save_transform(prefix)
         
-        # video output setting
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        
         # initialize output dataset
-        data_out = []
+        sinks = []
         for n, trans in enumerate(self.transformer_set):
             if trans is None:
-                data_out.append(None)
+                sinks.append(None)
             elif trans.type == VIDEO:
                 if skip_video:
-                    data_out.append(None)
+                    sinks.append(None)
                 else:
-                    fname = prefix + "(%d).avi"%(n)
-                    cap_out = cv2.VideoWriter(fname, fourcc, FPS, (trans.max_width, trans.max_height))
-                    if not cap_out.isOpened():
-                        raise ValueError("Cannot open the writable video file")
-                    data_out.append(cap_out)
+                    # the output keeps the frame rate of the source video unless video_fps is given
+                    fps = video_fps or self.cap.get(cv2.CAP_PROP_FPS) or FPS
+                    sinks.append(VideoSink(trans, prefix + "(%d).avi"%(n), fps=fps, writer=video_writer,
+                                           codec=video_codec, crf=video_crf, preset=video_preset))
             elif trans.type == TTL:
                 if skip_ttl:
-                    data_out.append(None)
+                    sinks.append(None)
                 else:
-                    data_out.append(np.zeros((frame_num, 3)))
+                    fname = prefix + "_ttl(%d)"%(n) + ttl_extension(ttl_format)
+                    events = None
+                    if ttl_events:
+                        fps = self.cap.get(cv2.CAP_PROP_FPS) or FPS
+                        events = TTLEventExtractor(prefix + "_ttl_events(%d).csv"%(n), fps)
+                    sinks.append(TTLSink(trans, fname, ttl_format=ttl_format, events=events))
             elif trans.type == TIME:
                 if skip_timestamp:
-                    data_out.append(None)
+                    sinks.append(None)
                 else:
-                    data_out.append([])
+                    ocr = get_ocr_backend(ocr_backend)
+                    if glyph_ocr:
+                        ocr = GlyphRecognizer(ocr)
+                    fname = prefix + "_timestamp(%d).txt"%(n)
+                    if predict_timestamp:
+                        sinks.append(PredictedTimestampSink(trans, fname, ocr=ocr, cache_size=ocr_cache_size,
+                                                            anchor_interval=anchor_interval))
+                    else:
+                        sinks.append(TimestampSink(trans, fname, ocr=ocr, cache_size=ocr_cache_size))
             else:
                 raise ValueError("Unexpected output type")
             
+        # time every stage per ROI (the sinks and the reader are only wrapped when profiling)
+        read_frame = self._read_timed_frame
+        if profiler is not None:
+            read_frame = profiler.wrap_reader(read_frame)
+            sinks = [None if sink is None else
+                     profiler.wrap_sink(sink, "%d:%s"%(n, ROI_NAMES[self.transformer_set[n].type]))
+                     for n, sink in enumerate(sinks)]
+        
         # verify
-        is_exist = False
-        for dout in data_out:
-            if dout is not None:
-                is_exist = True
-        if not is_exist:
+        sinks = [sink for sink in sinks if sink is not None]
+        if len(sinks) == 0:
             raise ValueError("There is no dataset to be exported")
         
         # extract dataset
-        pbar = progbar(total=int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)), desc="Exporting video")
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-        for n in range(frame_num):
-            # read frame
-            frame = self.read_frame()
-            if frame is None:
-                break
-            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-            
-            for dout, trans in zip(data_out, self.transformer_set):
-                if dout is None: continue
-                else:
-                    warp = trans.transform(frame)
-                    if trans.type == VIDEO:
-                        dout.write(warp)
-                    elif trans.type == TTL:
-                        dout[n] = warp.mean(axis=0).mean(axis=0)
-                    elif trans.type == TIME:
-                        dout.append(parse_timestamp(warp))
-            
-            pbar.update(n=1)
-        
-        # save dataset
-        for n, (dout, trans) in enumerate(zip(data_out, self.transformer_set)):
-            if dout is None: continue
+        pbar = progbar(total=frame_num, desc="Exporting video")
+        if profiler is not None and hasattr(pbar, "set_profiler"):
+            # live per-stage breakdown (tqdm_qt)
+            pbar.set_profiler(profiler)
+        # consecutive exports (checkpoint segments) continue without seeking
+        if int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)) != start_frame:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        if profiler is not None:
+            profiler.start()
+        try:
+            if pipeline:
+                run_pipeline(read_frame, sinks, frame_range, pbar,
+                             num_workers=num_workers, queue_size=queue_size,
+                             cancel_event=cancel_event)
             else:
-                if trans.type == VIDEO:
-                    dout.release()
-                elif trans.type == TTL:
-                    fname = prefix+"_ttl(%d).csv"%(n)
-                    self.save_ttl(dout, fname)
-                elif trans.type == TIME:
-                    self.save_datestr(dout, prefix+"_timestamp(%d).txt"%(n))
-        
-        pbar.close()            
+                for n in frame_range:
+                    if cancel_event is not None and cancel_event.is_set():
+                        break
+                    
+                    # read frame
+                    frame, msec = read_frame()
+                    if frame is None:
+                        break
+                    
+                    for sink in sinks:
+                        sink.write(n, sink.process(frame), msec)
+                    
+                    pbar.update(n=1)
+        finally:
+            # save dataset
+            for sink in sinks:
+                sink.close()
+            pbar.close()
+            if profiler is not None:
+                profiler.stop()
 
-        return True
+        return cancel_event is None or not cancel_event.is_set()
     
     def save_datestr(self, date_set, fname):
-        with open(fname, "w") as fp:
-            for time_str, sec_str in date_set:
-                fp.write("%s,%s\n"%(time_str, sec_str))
+        save_datestr(date_set, fname)
     
     def save_ttl(self, ttl, fname):
-        with open(fname, "w", newline='') as fp:
-            csv_writer = csv.writer(fp)
-            for n in range(len(ttl)):
-                csv_writer.writerow(ttl[n])
+        save_ttl(ttl, fname)
         
     def save_transform(self, prefix):
         with open(prefix+"_trans_option.pkl", "wb") as fp:
@@ -0,0 +1,214 @@
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# seconds between RSS samples
+RSS_INTERVAL = 0.5
+DECODE = "-"
+
+
+def current_rss_mb():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2**20
+    try:
+        with open("/proc/self/statm", "r") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def max_rss_mb():
+    # peak RSS of the whole process (ru_maxrss is KB on Linux, bytes on macOS)
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 2**20 if sys.platform == "darwin" else maxrss / 2**10
+
+
+class _ProfiledTransform:
+    # times warp and adjust of TransformInfo.transform, everything else is delegated
+    def __init__(self, trans, roi, profiler):
+        self.trans = trans
+        self.roi = roi
+        self.profiler = profiler
+
+    def transform(self, frame, *args, **kwargs):
+        tic = time.perf_counter()
+        frame = self.trans.warp(frame)
+        toc = time.perf_counter()
+        frame = self.trans.adjust(frame, *args, **kwargs)
+        self.profiler.add(self.roi, "warp", toc - tic)
+        self.profiler.add(self.roi, "adjust", time.perf_counter() - toc)
+        return frame
+
+    def __getattr__(self, name):
+        return getattr(self.trans, name)
+
+
+class ProfiledSink:
+    """
+    Times process/write/close of a sink. The time of process that is not
+    spent in the transform is reported as sink.PROCESS_STAGE, write and close
+    as sink.WRITE_STAGE.
+    """
+    def __init__(self, sink, roi, profiler):
+        self.sink = sink
+        self.roi = roi
+        self.profiler = profiler
+        self.write_stage = getattr(sink, "WRITE_STAGE", "write")
+        profiler.set_process_stage(roi, getattr(sink, "PROCESS_STAGE", "process"))
+        if getattr(sink, "trans", None) is not None:
+            sink.trans = _ProfiledTransform(sink.trans, roi, profiler)
+
+    def process(self, frame):
+        tic = time.perf_counter()
+        item = self.sink.process(frame)
+        self.profiler.add(self.roi, "process", time.perf_counter() - tic)
+        return item
+
+    def write(self, n, item, msec=None):
+        tic = time.perf_counter()
+        self.sink.write(n, item, msec)
+        self.profiler.add(self.roi, self.write_stage, time.perf_counter() - tic)
+
+    def close(self):
+        tic = time.perf_counter()
+        self.sink.close()
+        self.profiler.add(self.roi, self.write_stage, time.perf_counter() - tic, calls=0)
+
+
+class StageProfiler:
+    """
+    Timing counters of the export stages per ROI and peak RSS. Only used when
+    profiling is requested: export_video wraps the reader and the sinks with it.
+    In pipeline mode the stages overlap, so the percentages are relative to
+    the sum of the stage times rather than the wall time.
+    """
+    def __init__(self, rss_interval=RSS_INTERVAL):
+        self.rss_interval = rss_interval
+        self.frames = 0
+        self.wall_time = 0.
+        self.peak_rss_mb = None
+        self._times = dict()
+        self._process_stage = dict()
+        self._lock = threading.Lock()
+        self._tic = None
+        self._stop_event = threading.Event()
+        self._sampler = None
+
+    def add(self, roi, stage, seconds, calls=1):
+        with self._lock:
+            entry = self._times.setdefault((roi, stage), [0., 0])
+            entry[0] += seconds
+            entry[1] += calls
+
+    def set_process_stage(self, roi, stage):
+        self._process_stage[roi] = stage
+
+    def wrap_reader(self, read_frame):
+        def read():
+            tic = time.perf_counter()
+            frame, msec = read_frame()
+            if frame is not None:
+                self.add(DECODE, "decode", time.perf_counter() - tic)
+                self.frames += 1
+            return frame, msec
+        return read
+
+    def wrap_sink(self, sink, roi):
+        return ProfiledSink(sink, roi, self)
+
+    def start(self):
+        self._tic = time.perf_counter()
+        self._sample_rss()
+        self._stop_event.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        if self._tic is None:
+            return
+        self.wall_time += time.perf_counter() - self._tic
+        self._tic = None
+        self._stop_event.set()
+        self._sampler.join()
+        self._sample_rss()
+
+    def _sample_loop(self):
+        while not self._stop_event.wait(self.rss_interval):
+            self._sample_rss()
+
+    def _sample_rss(self):
+        rss = current_rss_mb()
+        if rss is not None and (self.peak_rss_mb is None or rss > self.peak_rss_mb):
+            self.peak_rss_mb = rss
+
+    def stages(self):
+        with self._lock:
+            times = {key: tuple(value) for key, value in self._times.items()}
+
+        rows = []
+        for (roi, stage), (seconds, calls) in times.items():
+            if stage == "process":
+                # time of the sink itself (OCR, mean, ...) without the transform
+                stage = self._process_stage.get(roi)
+                seconds -= times.get((roi, "warp"), (0,))[0] + times.get((roi, "adjust"), (0,))[0]
+                if stage is None:
+                    continue
+            rows.append({"roi": roi, "stage": stage, "seconds": max(seconds, 0.), "calls": calls})
+
+        total = sum(row["seconds"] for row in rows)
+        for row in rows:
+            row["fps"] = row["calls"] / row["seconds"] if row["seconds"] > 0 else None
+            row["percent"] = 100 * row["seconds"] / total if total > 0 else 0.
+        rows.sort(key=lambda row: (row["roi"] != DECODE, row["roi"]))
+        return rows
+
+    def report(self):
+        wall_time = self.wall_time
+        if self._tic is not None:
+            wall_time += time.perf_counter() - self._tic
+        return {
+            "frames": self.frames,
+            "wall_time": wall_time,
+            "fps": self.frames / wall_time if wall_time > 0 else None,
+            "peak_rss_mb": self.peak_rss_mb,
+            "max_rss_mb": max_rss_mb(),
+            "stages": self.stages(),
+        }
+
+    def format_report(self):
+        report = self.report()
+        lines = ["Export profile: %d frames in %.1f sec (%.1f frames/sec), peak RSS %s"
+                 %(report["frames"], report["wall_time"], report["fps"] or 0,
+                   "%.1f MB"%(report["peak_rss_mb"]) if report["peak_rss_mb"] is not None else "unknown"),
+                 "%-14s %-10s %10s %10s %12s %7s"%("roi", "stage", "time (s)", "calls", "frames/sec", "%")]
+        for row in report["stages"]:
+            lines.append("%-14s %-10s %10.2f %10d %12s %6.1f%%"
+                         %(row["roi"], row["stage"], row["seconds"], row["calls"],
+                           "%.1f"%(row["fps"]) if row["fps"] is not None else "-", row["percent"]))
+        return "\n".join(lines)
+
+    def format_breakdown(self, top=5):
+        # short live summary: the most expensive stages
+        rows = sorted(self.stages(), key=lambda row: -row["seconds"])[:top]
+        return "\n".join("%s %s: %.0f%%"%(row["roi"], row["stage"], row["percent"]) for row in rows)
+
+    def save(self, prefix):
+        with open(prefix + "_profile.json", "w") as fp:
+            json.dump(self.report(), fp, indent=2)
+        with open(prefix + "_profile.txt", "w") as fp:
+            fp.write(self.format_report() + "\n")
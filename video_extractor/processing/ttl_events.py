@@ -0,0 +1,258 @@
+import numpy as np
+import argparse
+import os
+
+from .ttl_io import iter_ttl, ttl_format_from_fname, TTL_COLUMNS, TTL_CHUNK_SIZE
+
+
+TTL_CHANNELS = TTL_COLUMNS[2:]
+TTL_EVENT_COLUMNS = ("channel", "onset_frame", "offset_frame", "onset_time", "duration")
+# number of frames used for the first estimate of the thresholds
+TTL_CALIB_SIZE = 3000
+# minimum difference between the mean of the off and on levels (channel values are 0-255)
+TTL_MIN_CONTRAST = 10
+OTSU_BINS = 256
+# fixed histogram range of the streaming estimate
+TTL_RANGE = (0, 256)
+
+
+def otsu_threshold(values, num_bins=OTSU_BINS, min_contrast=TTL_MIN_CONTRAST):
+    """
+    Two-cluster (Otsu) threshold of a 1D trace. Returns None if the trace
+    does not have two levels separated by at least min_contrast.
+    """
+    values = values[np.isfinite(values)]
+    if len(values) < 2:
+        return None
+    lo, hi = values.min(), values.max()
+    if hi - lo < min_contrast:
+        return None
+
+    hist, edges = np.histogram(values, bins=num_bins, range=(lo, hi))
+    return otsu_threshold_hist(hist, edges, min_contrast=min_contrast)
+
+
+def otsu_threshold_hist(hist, edges, min_contrast=TTL_MIN_CONTRAST):
+    # otsu_threshold of a histogram (counts of the bins between edges)
+    centers = (edges[:-1] + edges[1:]) / 2
+    filled = np.flatnonzero(hist)
+    if hist.sum() < 2 or centers[filled[-1]] - centers[filled[0]] < min_contrast:
+        return None
+
+    w0 = np.cumsum(hist)[:-1]
+    w1 = hist.sum() - w0
+    s0 = np.cumsum(hist * centers)[:-1]
+    mu0 = s0 / np.maximum(w0, 1)
+    mu1 = ((hist * centers).sum() - s0) / np.maximum(w1, 1)
+    k = np.argmax(w0 * w1 * (mu1 - mu0)**2)
+    if mu1[k] - mu0[k] < min_contrast:
+        return None
+    return edges[k+1]
+
+
+def _channel_histograms(rows, hist=None):
+    # histograms of the TTL channels over TTL_RANGE, added to hist if given
+    if hist is None:
+        hist = np.zeros((len(TTL_CHANNELS), OTSU_BINS))
+    for c in range(len(TTL_CHANNELS)):
+        values = rows[:, 2+c]
+        hist[c] += np.histogram(values[np.isfinite(values)], bins=OTSU_BINS, range=TTL_RANGE)[0]
+    return hist
+
+
+def _hist_thresholds(hist, min_contrast=TTL_MIN_CONTRAST):
+    edges = np.linspace(*TTL_RANGE, OTSU_BINS + 1)
+    return [otsu_threshold_hist(h, edges, min_contrast=min_contrast) for h in hist]
+
+
+class TTLEventExtractor:
+    """
+    Streaming onset/offset detection on TTL rows (TTL_COLUMNS). The per-channel
+    thresholds are estimated from the first calib_size rows (or given), after
+    that rows are processed block by block and only the on/off state of each
+    channel is carried between blocks. Channels without two levels in the
+    first rows (e.g. the LED starts later) keep a histogram of all rows and
+    are thresholded from the block in which both levels appear; until then
+    the channel is at one level, the state before that block is taken from it.
+
+    Events are written to a csv file with TTL_EVENT_COLUMNS. offset_frame is
+    the first frame after the pulse, times are in seconds (source timestamps,
+    or frame / fps if there are none).
+    """
+    def __init__(self, fname, fps, thresholds=None, calib_size=TTL_CALIB_SIZE,
+                 min_contrast=TTL_MIN_CONTRAST):
+        self.fname = fname
+        self.fps = fps
+        self.calib_size = calib_size
+        self.min_contrast = min_contrast
+        self.thresholds = None if thresholds is None else list(thresholds)
+        self.num_events = 0
+        self._calib = []
+        self._num_calib = 0
+        self._hist = np.zeros((len(TTL_CHANNELS), OTSU_BINS))
+        self._first = None  # (frame, time) of the first row
+        self._state = np.zeros(len(TTL_CHANNELS), dtype=bool)
+        self._onset = np.full((len(TTL_CHANNELS), 2), np.nan)  # (frame, time) of the open pulse
+        self.fp = open(fname, "w", newline='')
+        self.fp.write(",".join(TTL_EVENT_COLUMNS) + "\n")
+
+    def update(self, rows):
+        if self.thresholds is None:
+            self._calib.append(np.array(rows))
+            self._num_calib += len(rows)
+            if self._num_calib >= self.calib_size:
+                self._calibrate()
+            return
+        self._estimate(rows)
+        self._detect(rows)
+
+    def _calibrate(self):
+        rows = np.concatenate(self._calib) if self._calib else np.empty((0, len(TTL_COLUMNS)))
+        self._calib = []
+        _channel_histograms(rows, self._hist)
+        self.thresholds = _hist_thresholds(self._hist, min_contrast=self.min_contrast)
+        if len(rows) > 0:
+            self._detect(rows)
+
+    def _estimate(self, rows):
+        # channels without a threshold yet: add the block and estimate again
+        missing = [c for c, thr in enumerate(self.thresholds) if thr is None]
+        if not missing or len(rows) == 0:
+            return
+        edges = np.linspace(*TTL_RANGE, OTSU_BINS + 1)
+        centers = (edges[:-1] + edges[1:]) / 2
+        prior = self._hist.copy()
+        _channel_histograms(rows, self._hist)
+        for c in missing:
+            thr = otsu_threshold_hist(self._hist[c], edges, min_contrast=self.min_contrast)
+            if thr is None:
+                continue
+            self.thresholds[c] = thr
+            # the rows before were at one level: on since the first row if that level is high
+            if prior[c].sum() > 0 and (prior[c] * centers).sum() / prior[c].sum() > thr:
+                self._state[c] = True
+                self._onset[c] = self._first
+
+    def _frame_times(self, rows):
+        frames = rows[:, 0]
+        times = rows[:, 1] / 1000
+        no_time = ~np.isfinite(times)
+        times[no_time] = frames[no_time] / self.fps
+        return frames, times
+
+    def _detect(self, rows):
+        frames, times = self._frame_times(rows)
+        if self._first is None and len(rows) > 0:
+            self._first = frames[0], times[0]
+
+        events = []
+        for c, thr in enumerate(self.thresholds):
+            if thr is None:
+                continue
+            high = rows[:, 2+c] > thr
+            d = np.diff(high.astype(np.int8), prepend=np.int8(self._state[c]))
+            onsets = np.flatnonzero(d == 1)
+            offsets = np.flatnonzero(d == -1)
+
+            on_frame = frames[onsets]
+            on_time = times[onsets]
+            if self._state[c]:
+                # the pulse started in a previous block
+                on_frame = np.concatenate(([self._onset[c, 0]], on_frame))
+                on_time = np.concatenate(([self._onset[c, 1]], on_time))
+            num = len(offsets)
+            if num > 0:
+                events.append(np.stack([np.full(num, c), on_frame[:num], frames[offsets],
+                                        on_time[:num], times[offsets] - on_time[:num]], axis=1))
+
+            self._state[c] = high[-1]
+            if high[-1]:
+                self._onset[c] = on_frame[-1], on_time[-1]
+
+        if events:
+            self._write(np.concatenate(events))
+
+    def _write(self, events):
+        events = events[np.lexsort((events[:, 0], events[:, 1]))]
+        self.fp.write("".join("%s,%d,%s,%.3f,%s\n"%(TTL_CHANNELS[int(c)], on, "" if np.isnan(off) else "%d"%(off),
+                                                    t, "" if np.isnan(dur) else "%.3f"%(dur))
+                              for c, on, off, t, dur in events))
+        self.num_events += len(events)
+
+    def close(self):
+        if self.thresholds is None:
+            self._calibrate()
+        for ch, thr in zip(TTL_CHANNELS, self.thresholds):
+            if thr is None:
+                print("TTL events (%s): no pulses found in channel %s"%(os.path.basename(self.fname), ch))
+        # pulses still on at the end of the video have no offset
+        open_pulses = [(c, self._onset[c, 0], np.nan, self._onset[c, 1], np.nan)
+                       for c in np.flatnonzero(self._state)]
+        if open_pulses:
+            self._write(np.array(open_pulses))
+        self.fp.close()
+
+
+def ttl_thresholds(fname, ttl_format=None, chunk_size=TTL_CHUNK_SIZE, min_contrast=TTL_MIN_CONTRAST):
+    """
+    Otsu thresholds of the channels of a TTL file from the histogram of the
+    whole trace (None for channels without two levels).
+    """
+    if ttl_format is None:
+        ttl_format = ttl_format_from_fname(fname)
+    hist = None
+    for rows in iter_ttl(fname, ttl_format, chunk_size=chunk_size):
+        hist = _channel_histograms(rows, hist)
+    if hist is None:
+        return [None] * len(TTL_CHANNELS)
+    return _hist_thresholds(hist, min_contrast=min_contrast)
+
+
+def extract_ttl_events(fname, fout, fps, ttl_format=None, thresholds=None,
+                       calib_size=None, chunk_size=TTL_CHUNK_SIZE):
+    """
+    Extract the TTL events from an exported TTL file (<prefix>_ttl(%d).*).
+    Without thresholds, they are estimated from the whole file (a first pass
+    over it), or from the first calib_size rows if given.
+    """
+    if ttl_format is None:
+        ttl_format = ttl_format_from_fname(fname)
+    if thresholds is None and calib_size is None:
+        thresholds = ttl_thresholds(fname, ttl_format, chunk_size=chunk_size)
+        calib_size = TTL_CALIB_SIZE
+    extractor = TTLEventExtractor(fout, fps, thresholds=thresholds, calib_size=calib_size)
+    try:
+        for rows in iter_ttl(fname, ttl_format, chunk_size=chunk_size):
+            extractor.update(rows)
+    finally:
+        extractor.close()
+    return extractor.num_events
+
+
+def build_args():
+    parser = argparse.ArgumentParser(description="Extract TTL onsets/offsets from exported TTL files")
+    parser.add_argument("fnames", nargs="+", help="TTL files (<prefix>_ttl(%%d).csv/npy/h5/parquet)")
+    parser.add_argument("--fps", default=25, type=float,
+                        help="frame rate of the source video, used when the file has no timestamps (csv)")
+    parser.add_argument("--threshold", default=None, type=float, nargs=3, metavar=("B", "G", "R"),
+                        help="fixed thresholds instead of the automatic (Otsu) thresholds")
+    parser.add_argument("--calib_frames", default=None, type=int,
+                        help="estimate the thresholds from the first N frames (default: the whole file)")
+    return parser
+
+
+def main():
+    args = build_args().parse_args()
+    for fname in args.fnames:
+        base = os.path.splitext(fname)[0]
+        if "_ttl(" in base:
+            fout = base.replace("_ttl(", "_ttl_events(") + ".csv"
+        else:
+            fout = base + "_events.csv"
+        num_events = extract_ttl_events(fname, fout, args.fps, thresholds=args.threshold,
+                                        calib_size=args.calib_frames)
+        print("%s: %d events -> %s"%(fname, num_events, fout))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import numpy as np
+import itertools
+import os
+
+
+TTL_FORMATS = ("csv", "npy", "h5", "parquet")
+TTL_CHUNK_SIZE = 4096
+# frame index, source timestamp and the mean of each channel (frames are BGR)
+TTL_COLUMNS = ("frame", "timestamp_ms", "B", "G", "R")
+
+
+# h5py and pyarrow are only imported when a h5/parquet file is used (they are
+# slow to import and the CLI should start fast)
+def _import_h5py():
+    try:
+        import h5py
+    except ImportError:
+        raise ImportError("h5py is not installed, please run: pip install h5py (or pip install .[h5])")
+    return h5py
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("pyarrow is not installed, please run: pip install pyarrow (or pip install .[parquet])")
+    return pa, pq
+
+
+CSV_FMT = "%.6f"
+NPY_HEADER_SIZE = 128
+
+
+class CSVTTLWriter:
+    """
+    Channel means only, one row per frame (same layout as before).
+    """
+    def __init__(self, fname):
+        self.fp = open(fname, "w", newline='')
+
+    def write(self, rows):
+        values = rows[:, 2:]
+        line = ",".join([CSV_FMT] * values.shape[1]) + "\n"
+        self.fp.write((line * len(values)) % tuple(values.ravel()))
+
+    def close(self):
+        self.fp.close()
+
+
+class NpyTTLWriter:
+    """
+    Appends rows to a .npy file. The header is written with a fixed size and
+    rewritten with the final shape on close, so the file can be opened with
+    np.load(fname, mmap_mode="r").
+    """
+    def __init__(self, fname):
+        self.fp = open(fname, "wb")
+        self.num_rows = 0
+        self._write_header()
+
+    def _write_header(self):
+        header = "{'descr': '<f8', 'fortran_order': False, 'shape': (%d, %d), }"%(self.num_rows, len(TTL_COLUMNS))
+        header = header.ljust(NPY_HEADER_SIZE - 10 - 1) + "\n"
+        self.fp.seek(0)
+        self.fp.write(np.lib.format.magic(1, 0))
+        self.fp.write(np.uint16(len(header)).tobytes())
+        self.fp.write(header.encode("latin1"))
+
+    def write(self, rows):
+        self.fp.write(np.ascontiguousarray(rows, dtype="<f8").tobytes())
+        self.num_rows += len(rows)
+
+    def close(self):
+        self._write_header()
+        self.fp.close()
+
+
+class HDF5TTLWriter:
+    def __init__(self, fname):
+        h5py = _import_h5py()
+        self.fp = h5py.File(fname, "w")
+        self.dset = self.fp.create_dataset("ttl", shape=(0, len(TTL_COLUMNS)), maxshape=(None, len(TTL_COLUMNS)),
+                                           dtype="f8", chunks=(TTL_CHUNK_SIZE, len(TTL_COLUMNS)))
+        self.dset.attrs["columns"] = list(TTL_COLUMNS)
+
+    def write(self, rows):
+        n = self.dset.shape[0]
+        self.dset.resize(n + len(rows), axis=0)
+        self.dset[n:] = rows
+
+    def close(self):
+        self.fp.close()
+
+
+class ParquetTTLWriter:
+    def __init__(self, fname):
+        pa, pq = _import_pyarrow()
+        schema = pa.schema([("frame", pa.int64()), ("timestamp_ms", pa.float64())] +
+                           [(c, pa.float64()) for c in TTL_COLUMNS[2:]])
+        self.writer = pq.ParquetWriter(fname, schema)
+        self.pa = pa
+
+    def write(self, rows):
+        pa = self.pa
+        columns = [pa.array(rows[:, 0].astype(np.int64))] + [pa.array(rows[:, i]) for i in range(1, rows.shape[1])]
+        self.writer.write_table(pa.Table.from_arrays(columns, names=list(TTL_COLUMNS)))
+
+    def close(self):
+        self.writer.close()
+
+
+def open_ttl_writer(fname, ttl_format="csv"):
+    if ttl_format == "csv":
+        return CSVTTLWriter(fname)
+    elif ttl_format == "npy":
+        return NpyTTLWriter(fname)
+    elif ttl_format == "h5":
+        return HDF5TTLWriter(fname)
+    elif ttl_format == "parquet":
+        return ParquetTTLWriter(fname)
+    else:
+        raise ValueError("Unknown TTL format: %s"%(ttl_format))
+
+
+def load_ttl(fname, ttl_format="csv"):
+    """
+    Load TTL output as an array. csv files only have the channel columns,
+    the other formats have all TTL_COLUMNS.
+    """
+    if ttl_format == "csv":
+        return np.loadtxt(fname, delimiter=",", ndmin=2)
+    elif ttl_format == "npy":
+        return np.load(fname, mmap_mode="r")
+    elif ttl_format == "h5":
+        h5py = _import_h5py()
+        with h5py.File(fname, "r") as fp:
+            return fp["ttl"][:]
+    elif ttl_format == "parquet":
+        _, pq = _import_pyarrow()
+        table = pq.read_table(fname)
+        return np.stack([table.column(c).to_numpy().astype(np.float64) for c in TTL_COLUMNS], axis=1)
+    else:
+        raise ValueError("Unknown TTL format: %s"%(ttl_format))
+
+
+def iter_ttl(fname, ttl_format="csv", chunk_size=TTL_CHUNK_SIZE):
+    """
+    Read TTL output in blocks of chunk_size rows with all TTL_COLUMNS. csv files
+    have no frame/timestamp columns: frames are numbered from 0 and the
+    timestamps are nan.
+    """
+    if ttl_format == "csv":
+        with open(fname, "r") as fp:
+            start = 0
+            while True:
+                lines = list(itertools.islice(fp, chunk_size))
+                if len(lines) == 0:
+                    break
+                values = np.loadtxt(lines, delimiter=",", ndmin=2)
+                rows = np.empty((len(values), len(TTL_COLUMNS)))
+                rows[:, 0] = np.arange(start, start + len(values))
+                rows[:, 1] = np.nan
+                rows[:, 2:] = values
+                start += len(values)
+                yield rows
+    elif ttl_format == "npy":
+        data = np.load(fname, mmap_mode="r")
+        for i in range(0, len(data), chunk_size):
+            yield np.asarray(data[i:i+chunk_size])
+    elif ttl_format == "h5":
+        h5py = _import_h5py()
+        with h5py.File(fname, "r") as fp:
+            dset = fp["ttl"]
+            for i in range(0, dset.shape[0], chunk_size):
+                yield dset[i:i+chunk_size]
+    elif ttl_format == "parquet":
+        _, pq = _import_pyarrow()
+        for batch in pq.ParquetFile(fname).iter_batches(batch_size=chunk_size, columns=list(TTL_COLUMNS)):
+            yield np.stack([batch.column(c).to_numpy().astype(np.float64) for c in TTL_COLUMNS], axis=1)
+    else:
+        raise ValueError("Unknown TTL format: %s"%(ttl_format))
+
+
+def ttl_format_from_fname(fname):
+    ttl_format = os.path.splitext(fname)[1].lstrip(".").lower()
+    if ttl_format not in TTL_FORMATS:
+        raise ValueError("Unknown TTL format: %s"%(fname))
+    return ttl_format
+
+
+def ttl_extension(ttl_format):
+    return "." + ttl_format
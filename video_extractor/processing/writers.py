@@ -0,0 +1,98 @@
+import cv2
+import shutil
+import subprocess
+import tempfile
+
+
+VIDEO_WRITERS = ("opencv", "ffmpeg", "mjpg", "ffv1")
+FFMPEG_CODEC = "libx264"
+FFMPEG_CRF = 23
+FFMPEG_PRESET = "veryfast"
+
+
+class OpenCVWriter:
+    """
+    cv2.VideoWriter (single-threaded). XVID by default, MJPG for a fast
+    intra-only output.
+    """
+    def __init__(self, fname, size, fps, fourcc="XVID"):
+        self.writer = cv2.VideoWriter(fname, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if not self.writer.isOpened():
+            raise ValueError("Cannot open the writable video file")
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def close(self):
+        self.writer.release()
+
+
+class FFmpegWriter:
+    """
+    Feeds raw BGR frames to an ffmpeg process over a pipe, so that the frames
+    are encoded by ffmpeg (multi-threaded) with any of its codecs.
+    crf/preset are only used by codecs that support them (libx264, libx265).
+    """
+    def __init__(self, fname, size, fps, codec=FFMPEG_CODEC, crf=FFMPEG_CRF, preset=FFMPEG_PRESET):
+        if shutil.which("ffmpeg") is None:
+            raise FileNotFoundError("ffmpeg is not found, please install ffmpeg or use the opencv writer")
+
+        cmd = ["ffmpeg", "-y", "-loglevel", "error",
+               "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", "%dx%d"%(size),
+               "-r", "%g"%(fps), "-i", "-",
+               "-c:v", codec, "-threads", "0"]
+        if codec in ("libx264", "libx265"):
+            # 4:2:0 needs even dimensions
+            cmd += ["-crf", str(crf), "-preset", preset,
+                    "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p"]
+        cmd.append(fname)
+
+        self.size = size
+        self.log = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self.log)
+
+    def write(self, frame):
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            raise ValueError("Frame size %s does not match the video size %s"%(frame.shape[1::-1], self.size))
+        try:
+            self.proc.stdin.write(frame.tobytes())
+        except BrokenPipeError:
+            self._check(self.proc.wait())
+
+    def close(self):
+        if self.proc.stdin.closed:
+            return
+        try:
+            self.proc.stdin.close()
+            self._check(self.proc.wait())
+        finally:
+            self.log.close()
+
+    def _check(self, returncode):
+        if returncode != 0:
+            self.log.seek(0)
+            raise ValueError("ffmpeg failed: %s"%(self.log.read().decode(errors="ignore").strip()))
+
+
+def open_video_writer(fname, size, fps, writer="opencv", codec=FFMPEG_CODEC,
+                      crf=FFMPEG_CRF, preset=FFMPEG_PRESET):
+    """
+    size: (width, height)
+    writer: opencv (XVID), ffmpeg (codec/crf/preset), mjpg or ffv1 (intra-only, ffv1 is lossless)
+    """
+    if writer == "opencv":
+        return OpenCVWriter(fname, size, fps)
+    elif writer == "mjpg":
+        return OpenCVWriter(fname, size, fps, fourcc="MJPG")
+    elif writer == "ffmpeg":
+        return FFmpegWriter(fname, size, fps, codec=codec, crf=crf, preset=preset)
+    elif writer == "ffv1":
+        return FFmpegWriter(fname, size, fps, codec="ffv1")
+    else:
+        raise ValueError("Unknown video writer: %s"%(writer))
+
+
+def available_writers():
+    if shutil.which("ffmpeg") is None:
+        return [w for w in VIDEO_WRITERS if w not in ("ffmpeg", "ffv1")]
+    return list(VIDEO_WRITERS)